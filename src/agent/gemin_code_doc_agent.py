@@ -4,28 +4,41 @@ from llama_index.llms.gemini import Gemini
 import os
 from agent.sys_prompt import SYS_PROMPT
 from llama_index.core.agent.workflow import ReActAgent, AgentStream, ToolCallResult
+from llama_index.core.llms import LLM
 from llama_index.core.workflow import Context
 from classes.Milvus import Milvus
+from agent.profiler import AgentProfiler
 
 
 class GeminiCodeDocumentationReActAgent():
-    def __init__(self):
+    def __init__(self, profiler: AgentProfiler = None):
         self.api_key = os.getenv("GEMINI_API_KEY")
         self.milvus = None
         self.agent = None
         self.ctx = None
+        # records LLM steps, tool calls and retrieval timings of every invoke
+        self.profiler = profiler or AgentProfiler(trace_path=os.getenv("AGENT_TRACE_PATH"))
+        self.last_trace = None
 
     def connect_milvus(self, milvus: Milvus):
         self.milvus = milvus
+        self.milvus.profiler = self.profiler
         self.milvus.connect()
 
-    def initialize_agent(self, model_name: str):
+    def initialize_agent(self, model_name: str, llm: LLM = None):
+        """
+        Builds the ReAct agent with a Gemini LLM, or with the given llm, e.g. a scripted one
+        to exercise the agent loop and the profiler without calling Gemini, see
+        tests/test_agent_profiler.py.
+        """
         print("----- Initializing Gemini Code Documentation Agent -----")
 
         def _retrieve_codes_from_vector_database(query: str = None, file_path: str = None):
             print(f"Params: {query}, {file_path}")
-            text_nodes = self.milvus.retrieve_nodes(
-                query=query, file_path=file_path)
+            with self.profiler.tool_call("retrieve_codes_from_vector_database",
+                                         {"query": query, "file_path": file_path}):
+                text_nodes = self.milvus.retrieve_nodes(
+                    query=query, file_path=file_path)
             codes = ""
             for i, node in enumerate(text_nodes):
                 codes += f"Node # {i + 1}\n{node.text}\n {node.metadata} \n"
@@ -37,7 +50,7 @@ class GeminiCodeDocumentationReActAgent():
 
         self.agent = ReActAgent(
             system_prompt=SYS_PROMPT,
-            llm=Gemini(
+            llm=llm or Gemini(
                 model=model_name,
                 api_key=self.api_key,
             ),
@@ -64,11 +77,14 @@ class GeminiCodeDocumentationReActAgent():
 
         formatted_query = f"User query: {user_query}\nFile path: {file_path}" if file_path else f"User query: {user_query}"
 
+        self.profiler.start_invocation(formatted_query)
         handler = self.agent.run(user_msg=formatted_query, ctx=self.ctx)
 
         async for ev in handler.stream_events():
-            # if isinstance(ev, ToolCallResult):
-            #     print(f"\nCall {ev.tool_name} with {ev.tool_kwargs}\nReturned: {ev.tool_output}")
+            self.profiler.on_event(ev)
+            if isinstance(ev, ToolCallResult):
+                print(f"\nCall {ev.tool_name} with {ev.tool_kwargs}\n"
+                      f"Returned {len(str(ev.tool_output.content))} characters")
             if isinstance(ev, AgentStream):
                 print(f"{ev.delta}", end="", flush=True)
 
@@ -76,4 +92,8 @@ class GeminiCodeDocumentationReActAgent():
 
         print(str(response))
 
+        self.last_trace = self.profiler.finish_invocation()
+        print("---- Agent Profile ----")
+        print(AgentProfiler.summary_table(self.last_trace))
+
         return response
@@ -0,0 +1,203 @@
+import contextvars
+import json
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+
+from llama_index.core.agent.workflow import (
+    AgentInput,
+    AgentOutput,
+    AgentStream,
+    ToolCall,
+    ToolCallResult,
+)
+
+
+"""
+    Per invocation profiling of the ReAct agent loop.
+    LLM steps are timed from the AgentInput event to the AgentOutput event. Tool calls are
+    timed by the tool function itself (see AgentProfiler.tool_call), and code running inside
+    a tool, like the Milvus retrieval stages, records sub timings with AgentProfiler.span.
+    Event based timings are taken when the events reach the stream consumer.
+"""
+
+# used when the LLM response carries no usage metadata
+CHARS_PER_TOKEN = 4
+
+# the tool call that spans recorded in the current context belong to
+_active_tool_call = contextvars.ContextVar("active_tool_call", default=None)
+
+
+@dataclass
+class LLMStep():
+    index: int
+    latency_s: float = None
+    first_token_s: float = None
+    input_tokens: int = None
+    output_tokens: int = None
+    tokens_estimated: bool = False
+    started_at: float = field(default=None, repr=False)
+    input_chars: int = field(default=0, repr=False)
+
+
+@dataclass
+class ToolCallRecord():
+    tool_name: str
+    tool_kwargs: dict
+    duration_s: float = None
+    output_chars: int = None
+    spans: dict[str, float] = field(default_factory=dict)
+    started_at: float = field(default=None, repr=False)
+
+
+def _get(obj, key: str):
+    if isinstance(obj, dict):
+        return obj.get(key)
+    return getattr(obj, key, None)
+
+
+def extract_usage(raw) -> tuple[int, int]:
+    """Input and output token counts from a raw LLM response, Gemini or OpenAI style."""
+    if raw is None:
+        return None, None
+    usage = _get(raw, "usage_metadata") or _get(raw, "usage")
+    if usage is None:
+        return None, None
+    input_tokens = _get(usage, "prompt_token_count") or _get(usage, "prompt_tokens") \
+        or _get(usage, "input_tokens")
+    output_tokens = _get(usage, "candidates_token_count") or _get(usage, "completion_tokens") \
+        or _get(usage, "output_tokens")
+    return input_tokens, output_tokens
+
+
+class AgentProfiler():
+
+    def __init__(self, trace_path: str = None) -> None:
+        # every finished trace is appended to trace_path as one JSON line when set
+        self.trace_path = trace_path
+        self.traces: list[dict] = []
+        self._reset()
+
+    def _reset(self) -> None:
+        self.query = None
+        self.started_at = None
+        self.llm_steps: list[LLMStep] = []
+        self.tool_calls: list[ToolCallRecord] = []
+        self._open_step: LLMStep = None
+        self._pending_tool_calls: dict[str, float] = {}
+
+    def start_invocation(self, query: str) -> None:
+        self._reset()
+        self.query = query
+        self.started_at = time.perf_counter()
+
+    def on_event(self, ev) -> None:
+        now = time.perf_counter()
+        if isinstance(ev, AgentInput):
+            self._open_step = LLMStep(
+                index=len(self.llm_steps) + 1,
+                started_at=now,
+                input_chars=sum(len(str(m.content or "")) for m in ev.input),
+            )
+        elif isinstance(ev, AgentStream):
+            if self._open_step and self._open_step.first_token_s is None:
+                self._open_step.first_token_s = now - self._open_step.started_at
+        elif isinstance(ev, AgentOutput):
+            step = self._open_step or LLMStep(index=len(self.llm_steps) + 1, started_at=now)
+            step.latency_s = now - step.started_at
+            step.input_tokens, step.output_tokens = extract_usage(ev.raw)
+            if step.input_tokens is None and step.output_tokens is None:
+                step.tokens_estimated = True
+                step.input_tokens = step.input_chars // CHARS_PER_TOKEN
+                step.output_tokens = len(str(ev.response.content or "")) // CHARS_PER_TOKEN
+            self.llm_steps.append(step)
+            self._open_step = None
+        elif isinstance(ev, ToolCall) and not isinstance(ev, ToolCallResult):
+            self._pending_tool_calls[ev.tool_id] = now
+        elif isinstance(ev, ToolCallResult):
+            self._on_tool_result(ev, now)
+
+    def _on_tool_result(self, ev: ToolCallResult, now: float) -> None:
+        output_chars = len(str(ev.tool_output.content or ""))
+        for record in self.tool_calls:
+            # the record the tool function opened itself, it has the exact duration.
+            # Results arrive in call order, so the oldest unmatched one is taken.
+            if record.output_chars is None and record.tool_name == ev.tool_name:
+                record.tool_kwargs = ev.tool_kwargs
+                record.output_chars = output_chars
+                return
+        started_at = self._pending_tool_calls.pop(ev.tool_id, None)
+        self.tool_calls.append(ToolCallRecord(
+            tool_name=ev.tool_name,
+            tool_kwargs=ev.tool_kwargs,
+            duration_s=now - started_at if started_at is not None else None,
+            output_chars=output_chars,
+        ))
+
+    @contextmanager
+    def tool_call(self, tool_name: str, tool_kwargs: dict):
+        """Wraps the body of a tool function so its duration and inner spans are recorded."""
+        record = ToolCallRecord(
+            tool_name=tool_name, tool_kwargs=tool_kwargs, started_at=time.perf_counter())
+        self.tool_calls.append(record)
+        token = _active_tool_call.set(record)
+        try:
+            yield record
+        finally:
+            record.duration_s = time.perf_counter() - record.started_at
+            _active_tool_call.reset(token)
+
+    @contextmanager
+    def span(self, name: str):
+        """Times a block and adds it to the running tool call, summing repeated names."""
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = _active_tool_call.get()
+            if record is not None:
+                record.spans[name] = record.spans.get(name, 0.0) + time.perf_counter() - started_at
+
+    def finish_invocation(self) -> dict:
+        trace = {
+            "query": self.query,
+            "total_s": time.perf_counter() - self.started_at,
+            "llm_steps": [asdict(s) for s in self.llm_steps],
+            "tool_calls": [asdict(t) for t in self.tool_calls],
+        }
+        for item in trace["llm_steps"] + trace["tool_calls"]:
+            item.pop("started_at")
+            item.pop("input_chars", None)
+        self.traces.append(trace)
+        if self.trace_path:
+            with open(self.trace_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(trace, default=str) + "\n")
+        return trace
+
+    @staticmethod
+    def summary_table(trace: dict) -> str:
+        def _fmt(value, pattern: str = "{:.3f}") -> str:
+            return "-" if value is None else pattern.format(value)
+
+        lines = [
+            f"{'kind':<6} {'name':<40} {'seconds':>8} {'ttft':>7} {'in_tok':>7} {'out_tok':>7} {'out_chars':>9}",
+        ]
+        for step in trace["llm_steps"]:
+            estimated = "~" if step["tokens_estimated"] else ""
+            lines.append(
+                f"{'llm':<6} {'step ' + str(step['index']):<40} {_fmt(step['latency_s']):>8} "
+                f"{_fmt(step['first_token_s']):>7} "
+                f"{estimated + _fmt(step['input_tokens'], '{}'):>7} "
+                f"{estimated + _fmt(step['output_tokens'], '{}'):>7} {'-':>9}")
+        for call in trace["tool_calls"]:
+            lines.append(
+                f"{'tool':<6} {call['tool_name'][:40]:<40} {_fmt(call['duration_s']):>8} "
+                f"{'-':>7} {'-':>7} {'-':>7} {_fmt(call['output_chars'], '{}'):>9}")
+            for name, seconds in call["spans"].items():
+                lines.append(f"{'':<6} {'  ' + name:<40} {_fmt(seconds):>8}")
+        llm_total = sum(s["latency_s"] or 0 for s in trace["llm_steps"])
+        tool_total = sum(t["duration_s"] or 0 for t in trace["tool_calls"])
+        lines.append(
+            f"total {trace['total_s']:.3f}s, llm {llm_total:.3f}s in {len(trace['llm_steps'])} steps, "
+            f"tools {tool_total:.3f}s in {len(trace['tool_calls'])} calls (~ = estimated tokens)")
+        return "\n".join(lines)
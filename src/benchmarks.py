@@ -0,0 +1,122 @@
+import os
+import statistics
+import sys
+import time
+
+from dotenv import load_dotenv
+from pymilvus import MilvusClient
+
+from classes.Milvus import Milvus
+from collection_schema import COLLECTION_NAME, FILE_FILTER
+
+load_dotenv()
+
+
+def _summarize(label: str, timings: list[float]) -> dict:
+    timings = sorted(timings)
+    summary = {
+        "label": label,
+        "runs": len(timings),
+        "p50_ms": statistics.median(timings) * 1000,
+        "p95_ms": timings[int(0.95 * (len(timings) - 1))] * 1000,
+        "max_ms": timings[-1] * 1000,
+    }
+    print(f"{label:<40} runs={summary['runs']:<5} p50={summary['p50_ms']:8.2f}ms "
+          f"p95={summary['p95_ms']:8.2f}ms max={summary['max_ms']:8.2f}ms")
+    return summary
+
+
+def sample_file_paths(client: MilvusClient, collection_name: str, count: int = 50) -> list[str]:
+    rows = client.query(
+        collection_name=collection_name,
+        filter='id != ""',
+        output_fields=["file_path"],
+        limit=count * 20
+    )
+    return sorted({r["file_path"] for r in rows})[:count]
+
+
+def benchmark_filter_latency(client: MilvusClient,
+                             collection_name: str,
+                             query_filter: str,
+                             file_paths: list[str],
+                             label: str,
+                             repeat: int = 3) -> dict:
+    """Times a per-file metadata query, the one insert_data and file retrieval issue for every file."""
+    timings = []
+    for _ in range(repeat):
+        for file_path in file_paths:
+            start = time.perf_counter()
+            client.query(
+                collection_name=collection_name,
+                filter=query_filter,
+                filter_params={"file_path": file_path},
+                output_fields=["id"],
+                limit=1000
+            )
+            timings.append(time.perf_counter() - start)
+    return _summarize(label, timings)
+
+
+def benchmark_hierarchical_retrieval(milvus: Milvus,
+                                     queries: list[str],
+                                     fanouts: list[tuple[int, int]]) -> list[dict]:
+    """
+    Compares flat chunk search with the coarse-to-fine search for each (directory_fanout,
+    file_fanout) pair. Recall is the share of the flat top-k chunk ids the hierarchical
+    search also returns. Query embeddings are computed once and excluded from the timings.
+    """
+    embeddings = [milvus.embed_model.get_query_embedding(q) for q in queries]
+    top_k = milvus.similarity_top_k
+
+    flat_timings = []
+    flat_ids = []
+    for embedding in embeddings:
+        start = time.perf_counter()
+        hits = milvus.search_chunks(embedding)
+        flat_timings.append(time.perf_counter() - start)
+        flat_ids.append({hit["id"] for hit in hits[:top_k]})
+    print(f"---- Retrieval latency over {len(queries)} queries, top {top_k} ----")
+    results = [{**_summarize("flat", flat_timings), "recall": 1.0}]
+
+    for directory_fanout, file_fanout in fanouts:
+        milvus.directory_fanout = directory_fanout
+        milvus.file_fanout = file_fanout
+        timings = []
+        recalls = []
+        for embedding, expected in zip(embeddings, flat_ids):
+            start = time.perf_counter()
+            hits = milvus.search_chunks(embedding, milvus.search_candidate_files(embedding))
+            timings.append(time.perf_counter() - start)
+            found = {hit["id"] for hit in hits[:top_k]}
+            recalls.append(len(found & expected) / len(expected) if expected else 1.0)
+        summary = _summarize(f"hierarchical dirs={directory_fanout} files={file_fanout}", timings)
+        summary["recall"] = statistics.mean(recalls)
+        print(f"{'':<40} recall@{top_k}={summary['recall']:.3f}")
+        results.append(summary)
+    return results
+
+
+if __name__ == "__main__":
+    # Usage: python benchmarks.py [legacy_collection_name]
+    # The legacy name is the collection migrate_collection kept, to compare against the dynamic field.
+    # Retrieval queries are read one per line from BENCHMARK_QUERIES_PATH.
+    client = MilvusClient(uri=os.getenv("MILVUS_URI"), token=os.getenv("MILVUS_TOKEN"))
+    file_paths = sample_file_paths(client, COLLECTION_NAME)
+    print(f"---- Filter latency over {len(file_paths)} files ----")
+    benchmark_filter_latency(client, COLLECTION_NAME, FILE_FILTER, file_paths,
+                             "typed array_contains(file_paths)")
+    benchmark_filter_latency(client, COLLECTION_NAME, "file_path == {file_path}", file_paths,
+                             "typed file_path ==")
+    if len(sys.argv) > 1:
+        benchmark_filter_latency(client, sys.argv[1], "file_path == {file_path}", file_paths,
+                                 "dynamic field file_path ==")
+
+    queries_path = os.getenv("BENCHMARK_QUERIES_PATH")
+    if queries_path:
+        with open(queries_path, 'r', encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+        milvus = Milvus()
+        milvus.connect()
+        benchmark_hierarchical_retrieval(
+            milvus, queries, fanouts=[(0, 10), (0, 20), (3, 20), (5, 20), (5, 50)])
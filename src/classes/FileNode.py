@@ -1,5 +1,6 @@
 from llama_index.core.schema import TextNode
 from llama_index.core.text_splitter import CodeSplitter
+import hashlib
 import os
 
 
@@ -9,9 +10,18 @@ FILE_TYPE_MAPPING = {
 }
 
 
+def content_hash(text: str) -> str:
+    """
+    Hash of a chunk with trailing whitespace and surrounding blank lines removed, so
+    copies that differ only in formatting noise share one stored vector.
+    """
+    normalized = '\n'.join(line.rstrip() for line in text.strip('\n').split('\n'))
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
 class FileNode():
 
-    def __init__(self, file_path: str) -> None:
+    def __init__(self, file_path: str, git_blob: str = None) -> None:
         print("---- FileNode Initialization ----")
         file_path = file_path.replace("\\", "/")
         print(f"Processing file: {file_path}")
@@ -19,6 +29,8 @@ class FileNode():
         self.file_type = ""
         self.tot_lines = 0
         self.tot_chars = 0
+        # blob hash of the file in git, used instead of mtime to detect changes when available
+        self.git_blob = git_blob
         self.nodes: list[TextNode] = []
         self._generate_text_nodes(file_path)
         self.file_last_updated_at = os.path.getmtime(file_path)
@@ -46,25 +58,38 @@ class FileNode():
             # Usage:
             ast_chunks = code_splitter.split_text(source_code)
 
-            final_chunks = []
+            # (chunk, first line number) pairs. The splitter returns slices of the source,
+            # so the line of each AST chunk is found by locating it after the previous one.
+            final_chunks: list[tuple[str, int]] = []
+            search_from = 0
             for chunk in ast_chunks:
+                offset = source_code.find(chunk, search_from)
+                if offset == -1:
+                    offset = max(source_code.find(chunk), 0)
+                search_from = offset
+                first_line = source_code.count('\n', 0, offset) + 1
                 lines = chunk.split('\n')
                 for i in range(0, len(lines), chunk_lines - chunk_lines_overlap):
                     new_chunk = '\n'.join(lines[i:i + chunk_lines])
-                    final_chunks.append(new_chunk)
+                    final_chunks.append((new_chunk, first_line + i))
 
-            for i, chunk in enumerate(final_chunks):
+            for i, (chunk, start_line) in enumerate(final_chunks):
+                chunk_line_length = len(chunk.split('\n'))
+                metadata = {
+                    "file_path": file_path,
+                    "chunk_index": i + 1,
+                    "chunk_char_length": len(chunk),
+                    "chunk_line_length": chunk_line_length,
+                    "start_line": start_line,
+                    "end_line": start_line + chunk_line_length - 1,
+                    "is_last_chunk": i == len(final_chunks) - 1,
+                    "file_last_updated_at": os.path.getmtime(file_path)
+                }
+                if self.git_blob:
+                    metadata["git_blob"] = self.git_blob
+                # identical chunks get the same id wherever they appear, see milvus.insert_data
                 text_node = TextNode(
-                    text=chunk,
-                    metadata={
-                        "file_path": file_path,
-                        "chunk_index": i + 1,
-                        "chunk_char_length": len(chunk),
-                        "chunk_line_length": len(chunk.split('\n')),
-                        "is_last_chunk": i == len(final_chunks) - 1,
-                        "file_last_updated_at": os.path.getmtime(file_path)
-                    }
-                )
+                    id_=content_hash(chunk), text=chunk, metadata=metadata)
                 text_nodes.append(text_node)
 
         except Exception as e:
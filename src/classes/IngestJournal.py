@@ -0,0 +1,246 @@
+import sqlite3
+import time
+import uuid
+from array import array
+
+
+# File states, in the order a file moves through them
+SCANNED = "scanned"
+CHUNKED = "chunked"
+EMBEDDED = "embedded"
+WRITTEN = "written"
+FAILED = "failed"
+
+# A running job whose journal was not touched for this long is reported as stale, its
+# process most likely died. Every embedding sub batch and file state change touches it.
+STALE_AFTER_SECONDS = 15 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    folder_path TEXT NOT NULL,
+    overwrite INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    job_id TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    batch_id INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (job_id, file_path)
+);
+CREATE INDEX IF NOT EXISTS files_by_batch ON files (job_id, batch_id);
+CREATE TABLE IF NOT EXISTS embeddings (
+    job_id TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    PRIMARY KEY (job_id, content_hash)
+);
+"""
+
+
+class BatchEmbeddingCache():
+    """Embedding cache handed to milvus.write_file_nodes for one batch of a job."""
+
+    def __init__(self, journal: "IngestJournal", job_id: str, batch_id: int) -> None:
+        self.journal = journal
+        self.job_id = job_id
+        self.batch_id = batch_id
+
+    def get_embeddings(self, content_hashes: list[str]) -> dict[str, list[float]]:
+        return self.journal.get_embeddings(self.job_id, content_hashes)
+
+    def put_embeddings(self, embeddings: dict[str, list[float]]) -> None:
+        self.journal.put_embeddings(self.job_id, embeddings)
+        self.journal.set_batch_state(self.job_id, self.batch_id, EMBEDDED)
+
+
+class IngestJournal():
+    """
+    Durable record of an ingestion job in a local SQLite file. Every state change is committed
+    immediately, so a crashed job can resume from its last written batch, and embeddings are
+    kept until the job completes so a retried batch does not call the embedding model again.
+    The file can be read from another process while a job runs, see progress().
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        # WAL lets progress queries read while the job writes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def create_job(self, folder_path: str, overwrite: bool, file_paths: list[str], batch_size: int) -> str:
+        """Registers a job and its scanned files in one transaction, assigning files to batches."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO jobs VALUES (?, ?, ?, 'running', NULL, ?, ?, ?)",
+                (job_id, folder_path, int(overwrite), now, now, now))
+            self.conn.executemany(
+                "INSERT INTO files VALUES (?, ?, ?, ?, NULL, ?)",
+                [(job_id, path, i // batch_size, SCANNED, now)
+                 for i, path in enumerate(file_paths)])
+        return job_id
+
+    def find_unfinished_job(self, folder_path: str, overwrite: bool) -> str:
+        """
+        The latest running or failed job for the folder, if it was started with the same
+        overwrite flag. A job of the other kind would drop, or fail to drop, the collection
+        differently from what the caller asked for, so it is never resumed.
+        """
+        row = self.conn.execute(
+            "SELECT job_id, overwrite FROM jobs WHERE folder_path = ? "
+            "AND status IN ('running', 'failed') ORDER BY created_at DESC LIMIT 1",
+            (folder_path,)).fetchone()
+        if row is None or bool(row["overwrite"]) != overwrite:
+            return None
+        return row["job_id"]
+
+    def abandon_jobs(self, folder_path: str) -> int:
+        """Marks the unfinished jobs of the folder as abandoned, e.g. when a new job supersedes them."""
+        with self.conn:
+            job_ids = [row["job_id"] for row in self.conn.execute(
+                "SELECT job_id FROM jobs WHERE folder_path = ? AND status IN ('running', 'failed')",
+                (folder_path,))]
+            self.conn.executemany(
+                "UPDATE jobs SET status = 'abandoned', updated_at = ? WHERE job_id = ?",
+                [(time.time(), job_id) for job_id in job_ids])
+            self.conn.executemany(
+                "DELETE FROM embeddings WHERE job_id = ?", [(job_id,) for job_id in job_ids])
+        return len(job_ids)
+
+    def resume_job(self, job_id: str) -> None:
+        now = time.time()
+        with self.conn:
+            # the ETA is based on the throughput of this run only
+            self.conn.execute(
+                "UPDATE jobs SET status = 'running', error = NULL, started_at = ?, updated_at = ? "
+                "WHERE job_id = ?", (now, now, job_id))
+
+    def finish_job(self, job_id: str, error: str = None) -> None:
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                ("failed" if error else "completed", error, time.time(), job_id))
+            if not error:
+                self.conn.execute("DELETE FROM embeddings WHERE job_id = ?", (job_id,))
+
+    def pending_batches(self, job_id: str) -> list[tuple[int, list[str]]]:
+        """Batches with at least one file that is neither written nor failed, in order."""
+        rows = self.conn.execute(
+            "SELECT batch_id, file_path FROM files WHERE job_id = ? AND state NOT IN (?, ?) "
+            "ORDER BY batch_id, file_path", (job_id, WRITTEN, FAILED)).fetchall()
+        batches: dict[int, list[str]] = {}
+        for row in rows:
+            batches.setdefault(row["batch_id"], []).append(row["file_path"])
+        return list(batches.items())
+
+    def get_file_states(self, job_id: str, file_paths: list[str]) -> dict[str, str]:
+        states = {}
+        for i in range(0, len(file_paths), 500):
+            batch = file_paths[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT file_path, state FROM files WHERE job_id = ? "
+                f"AND file_path IN ({', '.join('?' * len(batch))})",
+                (job_id, *batch)).fetchall()
+            states.update((row["file_path"], row["state"]) for row in rows)
+        return states
+
+    def set_file_state(self, job_id: str, file_paths: list[str], state: str, error: str = None) -> None:
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE files SET state = ?, error = ?, updated_at = ? "
+                "WHERE job_id = ? AND file_path = ?",
+                [(state, error, now, job_id, path) for path in file_paths])
+            self.conn.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ?", (now, job_id))
+
+    def set_batch_state(self, job_id: str, batch_id: int, state: str) -> None:
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "UPDATE files SET state = ?, updated_at = ? "
+                "WHERE job_id = ? AND batch_id = ? AND state NOT IN (?, ?)",
+                (state, now, job_id, batch_id, WRITTEN, FAILED))
+            self.conn.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ?", (now, job_id))
+
+    def get_embeddings(self, job_id: str, content_hashes: list[str]) -> dict[str, list[float]]:
+        embeddings = {}
+        for i in range(0, len(content_hashes), 500):
+            batch = content_hashes[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT content_hash, vector FROM embeddings WHERE job_id = ? "
+                f"AND content_hash IN ({', '.join('?' * len(batch))})",
+                (job_id, *batch)).fetchall()
+            for row in rows:
+                embeddings[row["content_hash"]] = array('f', row["vector"]).tolist()
+        return embeddings
+
+    def put_embeddings(self, job_id: str, embeddings: dict[str, list[float]]) -> None:
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                [(job_id, h, array('f', v).tobytes())
+                 for h, v in embeddings.items()])
+
+    def embedding_cache(self, job_id: str, batch_id: int) -> BatchEmbeddingCache:
+        return BatchEmbeddingCache(self, job_id, batch_id)
+
+    def progress(self, job_id: str = None) -> dict:
+        """
+        File counts per state and an ETA for a job, the latest one if job_id is not given,
+        or an empty dict if there is no such job. The ETA extrapolates the rate at which files
+        were written since the job (re)started. A running job without any update in
+        STALE_AFTER_SECONDS is flagged stale and gets no ETA.
+        """
+        if job_id is None:
+            row = self.conn.execute(
+                "SELECT job_id FROM jobs ORDER BY created_at DESC LIMIT 1").fetchone()
+            if row is None:
+                return {}
+            job_id = row["job_id"]
+        job = self.conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if job is None:
+            return {}
+        counts = {row["state"]: row["count"] for row in self.conn.execute(
+            "SELECT state, COUNT(*) AS count FROM files WHERE job_id = ? GROUP BY state",
+            (job_id,))}
+        written_this_run = self.conn.execute(
+            "SELECT COUNT(*) FROM files WHERE job_id = ? AND state = ? AND updated_at >= ?",
+            (job_id, WRITTEN, job["started_at"])).fetchone()[0]
+
+        total = sum(counts.values())
+        done = counts.get(WRITTEN, 0) + counts.get(FAILED, 0)
+        now = time.time()
+        stale = job["status"] == "running" and now - job["updated_at"] > STALE_AFTER_SECONDS
+        running = job["status"] == "running" and not stale
+        elapsed = (now if running else job["updated_at"]) - job["started_at"]
+        rate = written_this_run / elapsed if elapsed > 0 else 0
+        eta = (total - done) / rate if rate and running else None
+        return {
+            "job_id": job_id,
+            "folder_path": job["folder_path"],
+            "status": job["status"],
+            "stale": stale,
+            "seconds_since_update": now - job["updated_at"],
+            "error": job["error"],
+            "total_files": total,
+            "done_files": done,
+            "states": counts,
+            "elapsed_seconds": elapsed,
+            "files_per_second": rate,
+            "eta_seconds": eta,
+        }
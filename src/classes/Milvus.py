@@ -2,13 +2,26 @@ import os
 from llama_index.core import StorageContext, VectorStoreIndex
 from llama_index.vector_stores.milvus import MilvusVectorStore
 from llama_index.embeddings.gemini import GeminiEmbedding
-from llama_index.core.schema import TextNode
+from llama_index.core.schema import TextNode, NodeWithScore
 from llama_index.core.vector_stores import (
     MetadataFilter,
     MetadataFilters,
     FilterOperator,
 )
 import json
+from contextlib import nullcontext
+from pymilvus import MilvusClient
+from classes.FileNode import content_hash
+from collection_schema import (
+    COLLECTION_NAME,
+    SUMMARY_COLLECTION_NAME,
+    EMBEDDING_DIM,
+    FILE_FILTER,
+    FILES_FILTER,
+    are_summaries_complete,
+    ensure_collection,
+)
+from summaries import like_prefix
 
 
 class Milvus():
@@ -18,13 +31,29 @@ class Milvus():
         self.vector_store = None
         self.index = None
         self.embed_model = None
+        self.similarity_top_k = 10
+        # fan-out of the coarse retrieval stages, directory_fanout = 0 skips the directory stage
+        self.hierarchical_retrieval = True
+        self.directory_fanout = 5
+        self.file_fanout = 20
+        # read on connect, the hierarchical search is only used once every indexed file has a
+        # summary, see summaries.ensure_summaries
+        self.summaries_complete = False
+        # an agent.profiler.AgentProfiler, set by the agent to record retrieval sub timings
+        self.profiler = None
 
     def connect(self):
+        client = MilvusClient(uri=os.getenv("MILVUS_URI"), token=os.getenv("MILVUS_TOKEN"))
+        ensure_collection(client)
+        self.summaries_complete = are_summaries_complete(client)
+        if not self.summaries_complete:
+            print("Summaries are not marked complete, retrieval stays flat until "
+                  "`python summaries.py` is run")
         self.vector_store = MilvusVectorStore(
             uri=os.getenv("MILVUS_URI"),
             token=os.getenv("MILVUS_TOKEN"),
-            collection_name="source_code_collection",
-            dim=768,  # Vector dimension depends on the embedding model
+            collection_name=COLLECTION_NAME,
+            dim=EMBEDDING_DIM,
             overwrite=False,  # Drop collection if exists
         )
         self.storage_ctx = StorageContext.from_defaults(
@@ -46,28 +75,60 @@ class Milvus():
 
         return self.index
 
-    def retrieve_nodes(self, query: str = None, file_path: str = None) -> list[TextNode]:
+    def retrieve_nodes(self, query: str = None, file_path: str = None, expand_references: bool = False) -> list[NodeWithScore]:
+        """
+        Vector search over the stored chunks. Chunks are stored once per unique content, and
+        any remaining copies with the same content are collapsed to the best scoring one.
+        With expand_references, one node is returned per place the chunk appears in.
+        Without a file_path the search is hierarchical once summaries are complete, see
+        search_candidate_files.
+        """
         print(f"retrieve nodes for ====> {file_path}")
         if (query is None and file_path is None):
             return []
         if (query is None):
             # query all nodes for the file
-            nodes = self._get_all_nodes_of_file(file_path)
+            with self._span("milvus.get_all_nodes_of_file"):
+                nodes = self._get_all_nodes_of_file(file_path)
             return nodes
-        filters = None
-        if (file_path is None):
-            filters = MetadataFilters(
-                filters=[
-                    MetadataFilter(
-                        key='metadata["file_path"]', value=file_path, operator=FilterOperator.EQ
-                    )
-                ]
-            )
 
-        retriever = self.index.as_retriever(
-            similarity_top_k=10, filters=filters)
+        with self._span("embedding.query"):
+            query_embedding = self.embed_model.get_query_embedding(query)
+        if (file_path is not None):
+            candidate_files = [file_path]
+        elif self.hierarchical_retrieval and self.summaries_complete:
+            with self._span("milvus.search_candidate_files"):
+                candidate_files = self.search_candidate_files(query_embedding)
+        else:
+            candidate_files = []
+        with self._span("milvus.search_chunks"):
+            hits = self.search_chunks(query_embedding, candidate_files)
+
+        nodes: list[NodeWithScore] = []
+        seen_hashes = set()
+        for hit in hits:
+            entity = hit["entity"]
+            chunk_hash = content_hash(entity["text"])
+            if chunk_hash in seen_hashes:
+                continue
+            seen_hashes.add(chunk_hash)
+            node = TextNode(
+                id_=hit["id"],
+                text=entity["text"],
+                metadata=json.loads(entity["_node_content"])["metadata"]
+            )
+            if not expand_references:
+                node.metadata = self._matched_metadata(node.metadata, candidate_files)
+            nodes.append(NodeWithScore(node=node, score=hit["distance"]))
+            if len(nodes) == self.similarity_top_k:
+                break
 
-        nodes = retriever.retrieve()
+        if expand_references:
+            nodes = [
+                NodeWithScore(node=expanded, score=n.score)
+                for n in nodes
+                for expanded in self.expand_references(n.node, file_path)
+            ]
 
         print(f"Retrieved {len(nodes)} nodes for file: {file_path}")
         print(f"---- List Of Nodes ----")
@@ -75,15 +136,91 @@ class Milvus():
             print(node)
         return nodes
 
+    def _span(self, name: str):
+        return self.profiler.span(name) if self.profiler else nullcontext()
+
+    def search_candidate_files(self, query_embedding: list[float]) -> list[str]:
+        """
+        Coarse stages of retrieval. The top directory_fanout directory vectors are searched
+        first, then the top file_fanout file vectors inside those directories.
+        Returns an empty list when there are no summaries, so the chunk search runs over everything.
+        Only files with a summary can be returned, see summaries_complete.
+        """
+        client = self.vector_store.client
+        file_filter = 'level == "file"'
+        filter_params = {}
+        if self.directory_fanout:
+            directories = client.search(
+                collection_name=SUMMARY_COLLECTION_NAME,
+                data=[query_embedding],
+                anns_field="embedding",
+                limit=self.directory_fanout,
+                filter='level == "directory"',
+                output_fields=["path"]
+            )[0]
+            if directories:
+                prefixes = [like_prefix(d['entity']['path']) for d in directories]
+                file_filter += " and (" + " or ".join(
+                    f"path like {{prefix_{i}}}" for i in range(len(prefixes))) + ")"
+                filter_params = {f"prefix_{i}": p for i, p in enumerate(prefixes)}
+
+        files = client.search(
+            collection_name=SUMMARY_COLLECTION_NAME,
+            data=[query_embedding],
+            anns_field="embedding",
+            limit=self.file_fanout,
+            filter=file_filter,
+            filter_params=filter_params,
+            output_fields=["path"]
+        )[0]
+        return [f["entity"]["path"] for f in files]
+
+    def search_chunks(self, query_embedding: list[float], file_paths: list[str] = None) -> list[dict]:
+        """Chunk level search, restricted to file_paths when given."""
+        return self.vector_store.client.search(
+            collection_name=COLLECTION_NAME,
+            data=[query_embedding],
+            anns_field="embedding",
+            # fetch extra hits so collapsing duplicates still leaves enough results
+            limit=self.similarity_top_k * 2,
+            filter=FILES_FILTER if file_paths else "",
+            filter_params={"file_paths": file_paths} if file_paths else {},
+            output_fields=["text", "_node_content"]
+        )[0]
+
+    @staticmethod
+    def _base_metadata(metadata: dict) -> dict:
+        # the reference list and file_paths can hold thousands of entries for vendored code,
+        # so they are never handed back with a node
+        return {k: v for k, v in metadata.items() if k not in ("references", "file_paths")}
+
+    def _matched_metadata(self, metadata: dict, file_paths: list[str]) -> dict:
+        """Metadata of the chunk's first reference inside file_paths, or of its first one."""
+        references = metadata.get("references") or [self._base_metadata(metadata)]
+        matched = next(
+            (r for r in references if r["file_path"] in file_paths), references[0])
+        return {**self._base_metadata(metadata), **matched}
+
+    def expand_references(self, node: TextNode, file_path: str = None) -> list[TextNode]:
+        """Returns one node per reference of a stored chunk, optionally only those in file_path."""
+        base_metadata = self._base_metadata(node.metadata)
+        references = node.metadata.get("references") or [base_metadata]
+        return [
+            TextNode(id_=node.node_id, text=node.text,
+                     metadata={**base_metadata, **reference})
+            for reference in references
+            if file_path is None or reference["file_path"] == file_path
+        ]
+
     def _get_all_nodes_of_file(self, file_path: str) -> list[TextNode]:
         client = self.vector_store.client
         print("---- Querying Directly From Milvus Collection ----")
         print("Running query:")
-        print(
-            f'file_path == "{file_path}"')
+        print(FILE_FILTER, file_path)
         results = client.query(
-            collection_name="source_code_collection",
-            filter=f'file_path == "{file_path}"',
+            collection_name=COLLECTION_NAME,
+            filter=FILE_FILTER,
+            filter_params={"file_path": file_path},
             output_fields=["text", "_node_content"],
             limit=1000
         )
@@ -93,13 +230,19 @@ class Milvus():
 
         print(f"Found {len(results)} results for file: {file_path}")
 
-        # Convert to TextNode objects
+        # Convert to TextNode objects, one per occurrence of a chunk in this file
         text_nodes = [
-            TextNode(
-                text=r["text"],
-                metadata=(json.loads(r["_node_content"]))["metadata"]
-            )
+            expanded
             for r in results
+            for expanded in self.expand_references(
+                TextNode(
+                    id_=r["id"],
+                    text=r["text"],
+                    metadata=(json.loads(r["_node_content"]))["metadata"]
+                ),
+                file_path
+            )
         ]
+        text_nodes.sort(key=lambda node: node.metadata.get("chunk_index", 0))
 
         return text_nodes
@@ -0,0 +1,407 @@
+import os
+import re
+import json
+import stat
+import hashlib
+from dataclasses import dataclass, field
+
+
+# Version control metadata, always pruned.
+VCS_DIRS = {'.git', '.hg', '.svn'}
+
+# Directories that rarely contain source worth indexing. They are applied as the lowest
+# priority ignore rules, so a `!build/` line in an ignore file brings one back.
+DEFAULT_IGNORED_DIRS = {
+    'node_modules', 'bower_components',
+    '__pycache__', '.venv', 'venv', 'env', 'site-packages',
+    '.tox', '.nox', '.mypy_cache', '.pytest_cache', '.ruff_cache',
+    'dist', 'build', 'out', 'coverage', '.next', '.nuxt', '.cache',
+}
+
+# File names that are generated or bundled output even if the extension matches.
+GENERATED_FILE_PATTERNS = [
+    re.compile(r'.*[.\-]min\.js$'),
+    re.compile(r'.*\.bundle\.js$'),
+    re.compile(r'.*\.chunk\.js$'),
+    re.compile(r'.*_pb2(_grpc)?\.py$'),
+]
+
+# Markers that show up in the header of machine generated files.
+GENERATED_CONTENT_MARKERS = [b'@generated', b'DO NOT EDIT', b'Code generated by']
+
+IGNORE_FILE_NAMES = ['.gitignore', '.codedocignore']
+
+CACHE_VERSION = 2
+
+
+@dataclass
+class IgnoreRule():
+    regex: re.Pattern
+    negate: bool
+    dir_only: bool
+
+
+@dataclass
+class ScannedFile():
+    file_path: str
+    size: int
+    mtime: float
+    # differs from the last saved scan, see RepositoryScanner.save_cache
+    changed: bool
+
+
+@dataclass
+class ScanResult():
+    files: list[ScannedFile] = field(default_factory=list)
+    # paths that were accepted in the previous scan but are gone or rejected now
+    removed: list[str] = field(default_factory=list)
+    skipped: dict[str, str] = field(default_factory=dict)
+
+
+def _translate_glob(pattern: str) -> str:
+    """Translates a single gitignore glob into a regular expression fragment."""
+    i, n = 0, len(pattern)
+    out = ''
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith('**/', i):
+            out += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('/**', i) and i + 3 == n:
+            out += '/.*'
+            i += 3
+        elif pattern.startswith('**', i):
+            out += '.*'
+            i += 2
+        elif c == '*':
+            out += '[^/]*'
+            i += 1
+        elif c == '?':
+            out += '[^/]'
+            i += 1
+        elif c == '[':
+            end = pattern.find(']', i + 1)
+            if end == -1:
+                out += re.escape(c)
+                i += 1
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                out += f'[{body}]'
+                i = end + 1
+        else:
+            out += re.escape(c)
+            i += 1
+    return out
+
+
+def parse_ignore_lines(lines: list[str], base: str = '') -> list[IgnoreRule]:
+    """
+    Compiles gitignore style lines into rules. `base` is the posix path of the
+    directory holding the ignore file, relative to the scan root.
+    """
+    rules: list[IgnoreRule] = []
+    prefix = re.escape(base + '/') if base else ''
+    for raw in lines:
+        line = raw.rstrip('\n').rstrip()
+        if not line or line.startswith('#'):
+            continue
+        negate = line.startswith('!')
+        if negate:
+            line = line[1:]
+        if line.startswith('\\'):
+            line = line[1:]
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            continue
+        anchored = '/' in line
+        line = line.lstrip('/')
+        regex = _translate_glob(line)
+        if not anchored:
+            regex = '(?:.*/)?' + regex
+        rules.append(IgnoreRule(
+            regex=re.compile(f'^{prefix}{regex}$'), negate=negate, dir_only=dir_only))
+    return rules
+
+
+def is_ignored(rel_path: str, is_dir: bool, rules: list[IgnoreRule]) -> bool:
+    """The last matching rule wins, like git."""
+    ignored = False
+    for rule in rules:
+        if rule.dir_only and not is_dir:
+            continue
+        if rule.regex.match(rel_path):
+            ignored = not rule.negate
+    return ignored
+
+
+class RepositoryScanner():
+    """
+    Walks a repository with os.scandir, pruning ignored directories as it goes.
+    Verdicts for files and listings for directories are cached by
+    (inode, size, mtime) so a re-scan of an unchanged tree only costs a stat per file.
+    The cache is only written by save_cache, which callers run once the scanned files are
+    indexed, so `changed` and `removed` are relative to what the index last saw.
+    """
+
+    def __init__(self,
+                 root: str,
+                 extensions: list[str],
+                 ignore_patterns: list[str] = None,
+                 max_file_size: int = 1024 * 1024,
+                 cache_path: str = None) -> None:
+        # paths are reported under the root as given, matching what os.walk used to produce
+        self.path_root = root
+        self.root = os.path.abspath(root)
+        self.extensions = {ext.lower() for ext in extensions}
+        self.max_file_size = max_file_size
+        self.cache_path = cache_path
+        self.base_rules = parse_ignore_lines(
+            [f"{name}/" for name in sorted(DEFAULT_IGNORED_DIRS)] + (ignore_patterns or []))
+        self.base_rules_key = hashlib.sha1(
+            '\n'.join(ignore_patterns or []).encode('utf-8')).hexdigest()
+        self._cache = self._load_cache()
+        self._scanned_cache = None
+        self._directory_rules_cache: dict[str, list[IgnoreRule]] = {}
+
+    def _load_cache(self) -> dict:
+        empty = {"version": CACHE_VERSION, "root": self.root, "dirs": {}, "files": {}}
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return empty
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable scan cache {self.cache_path}: {e}")
+            return empty
+        if cache.get("version") != CACHE_VERSION or cache.get("root") != self.root:
+            return empty
+        return cache
+
+    def save_cache(self) -> None:
+        """Persists the last scan, so the next one reports changes relative to it."""
+        if self._scanned_cache is None:
+            return
+        self._cache = self._scanned_cache
+        if not self.cache_path:
+            return
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._cache, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def _read_ignore_files(self, dir_path: str) -> tuple[list[str], list]:
+        """Returns the lines of the ignore files in a directory and their stat signature."""
+        lines: list[str] = []
+        signature = []
+        for name in IGNORE_FILE_NAMES:
+            path = os.path.join(dir_path, name)
+            try:
+                st = os.stat(path)
+                with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                    lines.extend(f.readlines())
+            except OSError:
+                continue
+            signature.append([name, st.st_ino, st.st_size, st.st_mtime_ns])
+        return lines, signature
+
+    def _ignore_signature(self, dir_path: str) -> list:
+        signature = []
+        for name in IGNORE_FILE_NAMES:
+            try:
+                st = os.stat(os.path.join(dir_path, name))
+            except OSError:
+                continue
+            signature.append([name, st.st_ino, st.st_size, st.st_mtime_ns])
+        return signature
+
+    def _list_directory(self, dir_path: str, rel_dir: str, rules: list[IgnoreRule]) -> tuple[list[str], list[str]]:
+        """Lists candidate files and sub directories, applying ignore rules and extension filters."""
+        files: list[str] = []
+        dirs: list[str] = []
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name in VCS_DIRS or is_ignored(rel_path, True, rules):
+                        continue
+                    dirs.append(entry.name)
+                elif entry.is_file():
+                    ext = os.path.splitext(entry.name)[1].lower()
+                    if ext not in self.extensions or is_ignored(rel_path, False, rules):
+                        continue
+                    files.append(entry.name)
+        return sorted(files), sorted(dirs)
+
+    def _check_file(self, path: str, size: int) -> str:
+        """Returns a reason to skip the file, or an empty string if it should be indexed."""
+        name = os.path.basename(path)
+        if size > self.max_file_size:
+            return "too large"
+        if size == 0:
+            return "empty"
+        if any(p.match(name) for p in GENERATED_FILE_PATTERNS):
+            return "generated"
+        with open(path, 'rb') as f:
+            sample = f.read(64 * 1024)
+        if b'\0' in sample:
+            return "binary"
+        try:
+            sample.decode('utf-8')
+        except UnicodeDecodeError as e:
+            # a multi byte character may be cut at the end of the sample
+            if e.start < len(sample) - 4:
+                return "binary"
+        header = sample[:2048]
+        if any(marker in header for marker in GENERATED_CONTENT_MARKERS):
+            return "generated"
+        lines = sample.split(b'\n')
+        longest = max(len(line) for line in lines)
+        average = len(sample) / len(lines)
+        if longest > 5000 or (average > 300 and longest > 1000):
+            return "minified"
+        return ""
+
+    def _directory_rules(self, rel_dir: str) -> list[IgnoreRule]:
+        """Rules of the ignore files inside one directory, read once per scanner."""
+        if rel_dir not in self._directory_rules_cache:
+            lines, _ = self._read_ignore_files(os.path.join(self.path_root, rel_dir))
+            self._directory_rules_cache[rel_dir] = parse_ignore_lines(lines, rel_dir)
+        return self._directory_rules_cache[rel_dir]
+
+    def accepts(self, rel_path: str) -> bool:
+        """
+        Checks a single path, relative to the root, without walking the tree. The ignore files
+        of every directory above it are applied in the same order scan() applies them, after
+        the default directories and the custom ignore patterns, then the file heuristics.
+        """
+        parts = rel_path.split('/')
+        if os.path.splitext(rel_path)[1].lower() not in self.extensions:
+            return False
+        rules = list(self.base_rules)
+        rel_dir = ''
+        for part in parts[:-1]:
+            rules += self._directory_rules(rel_dir)
+            rel_dir = f"{rel_dir}/{part}" if rel_dir else part
+            if part in VCS_DIRS or is_ignored(rel_dir, True, rules):
+                return False
+        rules += self._directory_rules(rel_dir)
+        if is_ignored(rel_path, False, rules):
+            return False
+        path = os.path.join(self.path_root, rel_path)
+        try:
+            return not self._check_file(path, os.path.getsize(path))
+        except OSError:
+            return False
+
+    def scan(self) -> ScanResult:
+        print(f"---- Scanning {self.root} ----")
+        old_dirs = self._cache["dirs"]
+        old_files = self._cache["files"]
+        new_cache = {"version": CACHE_VERSION, "root": self.root, "dirs": {}, "files": {}}
+        result = ScanResult()
+        reused_dirs = 0
+
+        # each entry carries the rules inherited from its ancestors and a key
+        # identifying them, so a changed parent ignore file invalidates cached listings
+        stack: list[tuple[str, str, list[IgnoreRule], str]] = [
+            (self.path_root, '', self.base_rules, self.base_rules_key)]
+        while stack:
+            dir_path, rel_dir, parent_rules, parent_key = stack.pop()
+            try:
+                dir_stat = os.stat(dir_path)
+            except OSError as e:
+                print(f"Skipping directory {dir_path} due to error: {e}")
+                continue
+
+            cached_dir = old_dirs.get(rel_dir)
+            signature = self._ignore_signature(dir_path)
+            if (cached_dir
+                    and cached_dir["ino"] == dir_stat.st_ino
+                    and cached_dir["mtime_ns"] == dir_stat.st_mtime_ns
+                    and cached_dir["ignore"] == signature
+                    and cached_dir["parent_key"] == parent_key):
+                files, dirs = cached_dir["files"], cached_dir["dirs"]
+                ignore_lines = cached_dir["rules"]
+                rules = parent_rules + parse_ignore_lines(ignore_lines, rel_dir)
+                new_cache["dirs"][rel_dir] = cached_dir
+                reused_dirs += 1
+            else:
+                ignore_lines, signature = self._read_ignore_files(dir_path)
+                rules = parent_rules + parse_ignore_lines(ignore_lines, rel_dir)
+                try:
+                    files, dirs = self._list_directory(dir_path, rel_dir, rules)
+                except OSError as e:
+                    print(f"Skipping directory {dir_path} due to error: {e}")
+                    continue
+                new_cache["dirs"][rel_dir] = {
+                    "ino": dir_stat.st_ino,
+                    "mtime_ns": dir_stat.st_mtime_ns,
+                    "ignore": signature,
+                    "parent_key": parent_key,
+                    "rules": ignore_lines,
+                    "files": files,
+                    "dirs": dirs,
+                }
+
+            for name in files:
+                rel_path = f"{rel_dir}/{name}" if rel_dir else name
+                path = os.path.join(dir_path, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if not stat.S_ISREG(st.st_mode):
+                    continue
+                cached = old_files.get(rel_path)
+                changed = not (cached
+                               and cached["ino"] == st.st_ino
+                               and cached["size"] == st.st_size
+                               and cached["mtime_ns"] == st.st_mtime_ns)
+                if changed:
+                    try:
+                        reason = self._check_file(path, st.st_size)
+                    except OSError as e:
+                        print(f"Skipping {path} due to error: {e}")
+                        continue
+                else:
+                    reason = cached["reason"]
+                new_cache["files"][rel_path] = {
+                    "ino": st.st_ino,
+                    "size": st.st_size,
+                    "mtime_ns": st.st_mtime_ns,
+                    "reason": reason,
+                }
+                if reason:
+                    result.skipped[path.replace("\\", "/")] = reason
+                    continue
+                result.files.append(ScannedFile(
+                    file_path=path.replace("\\", "/"),
+                    size=st.st_size,
+                    mtime=st.st_mtime,
+                    changed=changed,
+                ))
+
+            rules_key = hashlib.sha1(
+                (parent_key + rel_dir + ''.join(ignore_lines)).encode('utf-8')).hexdigest()
+            for name in reversed(dirs):
+                rel_path = f"{rel_dir}/{name}" if rel_dir else name
+                stack.append((os.path.join(dir_path, name), rel_path, rules, rules_key))
+
+        for rel_path, cached in old_files.items():
+            if cached["reason"]:
+                continue
+            current = new_cache["files"].get(rel_path)
+            if current is None or current["reason"]:
+                result.removed.append(
+                    os.path.join(self.path_root, rel_path).replace("\\", "/"))
+
+        self._scanned_cache = new_cache
+
+        changed_count = sum(1 for f in result.files if f.changed)
+        print(f"Scanned {len(result.files)} files ({changed_count} changed, "
+              f"{len(result.skipped)} skipped, {len(result.removed)} removed, "
+              f"{reused_dirs} cached directories)")
+        return result
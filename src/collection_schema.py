@@ -0,0 +1,229 @@
+import json
+import time
+
+from pymilvus import MilvusClient, DataType
+
+
+COLLECTION_NAME = "source_code_collection"
+# file and directory level vectors used to narrow chunk searches, see summaries.py
+SUMMARY_COLLECTION_NAME = "source_code_summary_collection"
+EMBEDDING_DIM = 768  # Vector dimension depends on the embedding model
+MAX_PATH_LENGTH = 1024
+# Milvus caps array fields at 4096 elements, a chunk copied into more files keeps only the first ones
+MAX_FILE_PATHS = 4096
+
+# Row of the summary collection whose presence marks every indexed file as summarized.
+# It is written by summaries.ensure_summaries and when both collections are created empty.
+SUMMARIES_COMPLETE_ID = "status:complete"
+
+# Fields that describe one occurrence of a chunk. A stored chunk keeps one reference per
+# place it appears in, and mirrors the first one in typed columns for simple filters.
+REFERENCE_FIELDS = ["file_path", "chunk_index", "start_line", "end_line",
+                    "file_last_updated_at", "git_blob"]
+
+# Filter templates, values are always bound through filter_params and never formatted in.
+FILES_FILTER = "array_contains_any(file_paths, {file_paths})"
+FILE_FILTER = "array_contains(file_paths, {file_path})"
+IDS_FILTER = "id in {ids}"
+PARENTS_FILTER = "parent in {parents}"
+
+
+def build_schema():
+    """
+    Typed layout of the chunk collection. It matches what MilvusVectorStore reads and writes,
+    with the filterable metadata promoted from the dynamic JSON field to scalar columns.
+    """
+    schema = MilvusClient.create_schema(auto_id=False, enable_dynamic_field=True)
+    schema.add_field("id", DataType.VARCHAR, max_length=128, is_primary=True)
+    schema.add_field("embedding", DataType.FLOAT_VECTOR, dim=EMBEDDING_DIM)
+    schema.add_field("text", DataType.VARCHAR, max_length=65535)
+    schema.add_field("doc_id", DataType.VARCHAR, max_length=128)
+    schema.add_field("file_path", DataType.VARCHAR, max_length=MAX_PATH_LENGTH)
+    schema.add_field("file_paths", DataType.ARRAY, element_type=DataType.VARCHAR,
+                     max_capacity=MAX_FILE_PATHS, max_length=MAX_PATH_LENGTH)
+    schema.add_field("chunk_index", DataType.INT64)
+    schema.add_field("start_line", DataType.INT64, nullable=True)
+    schema.add_field("end_line", DataType.INT64, nullable=True)
+    schema.add_field("file_last_updated_at", DataType.DOUBLE)
+    schema.add_field("git_blob", DataType.VARCHAR, max_length=64, nullable=True)
+    schema.add_field("references", DataType.JSON)
+    return schema
+
+
+def build_index_params(client: MilvusClient):
+    index_params = client.prepare_index_params()
+    # IP is the metric MilvusVectorStore creates its collections with
+    index_params.add_index(field_name="embedding", index_type="AUTOINDEX", metric_type="IP")
+    index_params.add_index(field_name="file_path", index_type="INVERTED")
+    index_params.add_index(field_name="file_paths", index_type="INVERTED")
+    index_params.add_index(field_name="git_blob", index_type="INVERTED")
+    index_params.add_index(field_name="chunk_index", index_type="STL_SORT")
+    index_params.add_index(field_name="file_last_updated_at", index_type="STL_SORT")
+    return index_params
+
+
+def build_summary_schema():
+    schema = MilvusClient.create_schema(auto_id=False, enable_dynamic_field=False)
+    schema.add_field("id", DataType.VARCHAR, max_length=MAX_PATH_LENGTH + 16, is_primary=True)
+    schema.add_field("embedding", DataType.FLOAT_VECTOR, dim=EMBEDDING_DIM)
+    # "file" or "directory"
+    schema.add_field("level", DataType.VARCHAR, max_length=16)
+    schema.add_field("path", DataType.VARCHAR, max_length=MAX_PATH_LENGTH)
+    schema.add_field("parent", DataType.VARCHAR, max_length=MAX_PATH_LENGTH)
+    # number of chunks the vector averages over, used to weight it in its parent
+    schema.add_field("chunk_count", DataType.INT64)
+    return schema
+
+
+def build_summary_index_params(client: MilvusClient):
+    index_params = client.prepare_index_params()
+    index_params.add_index(field_name="embedding", index_type="AUTOINDEX", metric_type="IP")
+    index_params.add_index(field_name="level", index_type="INVERTED")
+    index_params.add_index(field_name="path", index_type="Trie")
+    index_params.add_index(field_name="parent", index_type="INVERTED")
+    return index_params
+
+
+def is_typed_collection(client: MilvusClient, collection_name: str = COLLECTION_NAME) -> bool:
+    fields = client.describe_collection(collection_name)["fields"]
+    return any(f["name"] == "file_paths" for f in fields)
+
+
+def ensure_collection(client: MilvusClient, overwrite: bool = False) -> None:
+    """
+    Creates the typed collections if missing, or recreates them when overwrite is set.
+    Raises if the chunk collection still uses the untyped layout, every filter reads the
+    file_paths column, so its rows would never match and every file would be re-embedded
+    next to the old rows.
+    """
+    for name in (COLLECTION_NAME, SUMMARY_COLLECTION_NAME):
+        if overwrite and client.has_collection(name):
+            print(f"Dropping collection {name}")
+            client.drop_collection(name)
+    summaries_created = not client.has_collection(SUMMARY_COLLECTION_NAME)
+    if summaries_created:
+        print(f"Creating summary collection {SUMMARY_COLLECTION_NAME}")
+        client.create_collection(
+            collection_name=SUMMARY_COLLECTION_NAME,
+            schema=build_summary_schema(),
+            index_params=build_summary_index_params(client)
+        )
+    if client.has_collection(COLLECTION_NAME):
+        if not is_typed_collection(client):
+            raise RuntimeError(
+                f"{COLLECTION_NAME} uses the untyped layout, run main.project_migrate to copy "
+                f"it to the typed schema before reading or writing it")
+        return
+    print(f"Creating typed collection {COLLECTION_NAME}")
+    client.create_collection(
+        collection_name=COLLECTION_NAME,
+        schema=build_schema(),
+        index_params=build_index_params(client)
+    )
+    if summaries_created:
+        # both are empty, and every write summarizes the files it touches
+        set_summaries_complete(client)
+
+
+def set_summaries_complete(client: MilvusClient) -> None:
+    client.upsert(collection_name=SUMMARY_COLLECTION_NAME, data=[{
+        "id": SUMMARIES_COMPLETE_ID,
+        # never searched, the level filters of the retrieval stages exclude it
+        "embedding": [1.0] + [0.0] * (EMBEDDING_DIM - 1),
+        "level": "status",
+        "path": "",
+        "parent": "",
+        "chunk_count": 0,
+    }])
+
+
+def are_summaries_complete(client: MilvusClient) -> bool:
+    """A single primary key lookup, cheap enough to run whenever retrieval starts."""
+    return bool(client.get(collection_name=SUMMARY_COLLECTION_NAME,
+                           ids=[SUMMARIES_COMPLETE_ID], output_fields=["id"]))
+
+
+def row_references(row: dict) -> list[dict]:
+    if row.get("references"):
+        return row["references"]
+    # rows stored before chunks were deduplicated describe a single occurrence
+    return [{key: row[key] for key in REFERENCE_FIELDS if key in row}]
+
+
+def apply_references(row: dict, references: list[dict]) -> dict:
+    """
+    Writes the reference list onto a stored row, both in the typed columns and inside
+    _node_content, coercing values to the column types.
+    """
+    references = sorted(
+        references, key=lambda r: (r["file_path"], int(r.get("chunk_index", 0))))
+    for reference in references:
+        reference["chunk_index"] = int(reference.get("chunk_index", 0))
+        reference["file_last_updated_at"] = float(reference.get("file_last_updated_at", 0))
+    first = references[0]
+    fields = {
+        "file_path": first["file_path"],
+        "chunk_index": first["chunk_index"],
+        "start_line": first.get("start_line"),
+        "end_line": first.get("end_line"),
+        "file_last_updated_at": first["file_last_updated_at"],
+        "git_blob": first.get("git_blob"),
+        "references": references,
+        "file_paths": sorted({r["file_path"] for r in references})[:MAX_FILE_PATHS],
+    }
+    node_content = json.loads(row["_node_content"])
+    node_content["metadata"].update(fields)
+    row.update(fields)
+    row["_node_content"] = json.dumps(node_content)
+    return row
+
+
+def migrate_collection(client: MilvusClient, batch_size: int = 500) -> str:
+    """
+    Copies an untyped collection into a new typed one, vectors included, and swaps the names.
+    The old collection is kept under a timestamped name so the migration can be rolled back.
+    Returns the name of the kept collection, or an empty string if nothing was migrated.
+    """
+    if not client.has_collection(COLLECTION_NAME) or is_typed_collection(client):
+        print(f"{COLLECTION_NAME} is already typed, nothing to migrate")
+        return ""
+
+    target_name = f"{COLLECTION_NAME}_typed"
+    legacy_name = f"{COLLECTION_NAME}_legacy_{int(time.time())}"
+    if client.has_collection(target_name):
+        # leftover of an interrupted migration
+        client.drop_collection(target_name)
+    client.create_collection(
+        collection_name=target_name,
+        schema=build_schema(),
+        index_params=build_index_params(client)
+    )
+
+    print(f"---- Migrating {COLLECTION_NAME} to typed schema ----")
+    copied = 0
+    iterator = client.query_iterator(
+        collection_name=COLLECTION_NAME,
+        batch_size=batch_size,
+        filter='id != ""',
+        output_fields=["*"]
+    )
+    try:
+        while True:
+            rows = iterator.next()
+            if not rows:
+                break
+            for row in rows:
+                row["doc_id"] = str(row.get("doc_id", "None"))
+                apply_references(row, row_references(row))
+            client.insert(collection_name=target_name, data=rows)
+            copied += len(rows)
+            print(f"Copied {copied} rows")
+    finally:
+        iterator.close()
+
+    client.rename_collection(old_name=COLLECTION_NAME, new_name=legacy_name)
+    client.rename_collection(old_name=target_name, new_name=COLLECTION_NAME)
+    print(f"Migrated {copied} rows. The untyped collection was kept as {legacy_name}, "
+          f"drop it once the new one is verified.")
+    return legacy_name
+
@@ -1,5 +1,5 @@
 import os
-from classes.FileNode import FileNode
+from classes.RepositoryScanner import RepositoryScanner
 
 
 # For the purposes of this project, make sure only code files are processed. Do not allow other file types like images and text files.
@@ -8,20 +8,21 @@ FILE_TYPE_MAPPING = {
     '.js': 'javascript'
 }
 
+# Files above this size are almost always bundles or generated data, not hand written code.
+MAX_FILE_SIZE = 512 * 1024
 
-def generate_file_nodes(folder_path: str) -> list[FileNode]:
 
-    nodes: list[FileNode] = []
+def get_scanner(folder_path: str) -> RepositoryScanner:
+    """
+    Builds the repository scanner. Extra ignore patterns can be passed as a comma separated
+    list in SCAN_IGNORE_PATTERNS, and the stat cache location is set with SCAN_CACHE_PATH.
+    """
+    extra_patterns = os.getenv("SCAN_IGNORE_PATTERNS", "")
+    return RepositoryScanner(
+        root=folder_path,
+        extensions=list(FILE_TYPE_MAPPING.keys()),
+        ignore_patterns=[p.strip() for p in extra_patterns.split(",") if p.strip()],
+        max_file_size=int(os.getenv("SCAN_MAX_FILE_SIZE", MAX_FILE_SIZE)),
+        cache_path=os.getenv("SCAN_CACHE_PATH", ".scan_cache.json"),
+    )
 
-    for root, _, files in os.walk(folder_path):
-        for file in files:
-            ext = os.path.splitext(file)[1].lower()
-            if ext in FILE_TYPE_MAPPING:
-                file_path = os.path.join(root, file)
-                try:
-                    file_node = FileNode(file_path)
-                    nodes.append(file_node)
-                except Exception as e:
-                    print(f"Skipping {file_path} due to error: {e}")
-
-    return nodes
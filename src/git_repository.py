@@ -0,0 +1,127 @@
+import os
+import subprocess
+from dataclasses import dataclass, field
+
+
+"""
+    Git plumbing used by git_sync. Paths are relative to the folder passed in, which may be
+    a sub directory of the repository.
+"""
+
+
+@dataclass
+class GitDiff():
+    added: list[str] = field(default_factory=list)
+    modified: list[str] = field(default_factory=list)
+    deleted: list[str] = field(default_factory=list)
+    # pure renames only, a rename with edits is reported as deleted + added
+    renamed: list[tuple[str, str]] = field(default_factory=list)
+
+
+def _git(folder_path: str, *args: str) -> str:
+    result = subprocess.run(
+        ["git", "-C", folder_path, *args],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout
+
+
+def get_head_commit(folder_path: str) -> str:
+    return _git(folder_path, "rev-parse", "HEAD").strip()
+
+
+def get_blob_hashes(folder_path: str) -> dict[str, str]:
+    """
+    Returns the blob hash of every file under folder_path, keyed by path relative to it.
+    Uncommitted edits and untracked files are hashed from the working tree, so the result
+    describes what is actually on disk.
+    """
+    blobs: dict[str, str] = {}
+    for entry in _git(folder_path, "ls-tree", "-r", "-z", "HEAD").split("\0"):
+        if not entry:
+            continue
+        meta, path = entry.split("\t", 1)
+        _, object_type, sha = meta.split()
+        if object_type == "blob":
+            blobs[path] = sha
+
+    for path in get_dirty_paths(folder_path):
+        if not os.path.isfile(os.path.join(folder_path, path)):
+            blobs.pop(path, None)
+            continue
+        sha = _git(folder_path, "hash-object", "--", path).strip()
+        blobs[path] = sha
+
+    return blobs
+
+
+def get_dirty_paths(folder_path: str) -> list[str]:
+    """Tracked files that differ from HEAD in the working tree, plus untracked files."""
+    modified = _git(folder_path, "diff", "--name-only", "-z", "--relative", "HEAD")
+    untracked = _git(folder_path, "ls-files", "--others", "--exclude-standard", "-z")
+    return sorted({p for p in (modified + untracked).split("\0") if p})
+
+
+def has_commit(folder_path: str, commit: str) -> bool:
+    """False when the commit is not in the local object store, e.g. after a force push or in a shallow clone."""
+    result = subprocess.run(
+        ["git", "-C", folder_path, "cat-file", "-e", f"{commit}^{{commit}}"],
+        capture_output=True,
+    )
+    return result.returncode == 0
+
+
+def diff_commits(folder_path: str, base_commit: str, head_commit: str) -> GitDiff:
+    output = _git(folder_path, "diff", "--name-status", "-z", "-M",
+                  "--relative", base_commit, head_commit)
+    tokens = output.split("\0")
+    diff = GitDiff()
+    i = 0
+    while i < len(tokens) and tokens[i]:
+        status = tokens[i]
+        if status[0] in ("R", "C"):
+            old_path, new_path = tokens[i + 1], tokens[i + 2]
+            i += 3
+            if status[0] == "C":
+                diff.added.append(new_path)
+            elif status == "R100":
+                diff.renamed.append((old_path, new_path))
+            else:
+                diff.deleted.append(old_path)
+                diff.added.append(new_path)
+            continue
+        path = tokens[i + 1]
+        i += 2
+        if status == "A":
+            diff.added.append(path)
+        elif status == "D":
+            diff.deleted.append(path)
+        else:
+            diff.modified.append(path)
+    return diff
+
+
+def add_dirty_paths(diff: GitDiff, dirty_paths: set[str], blobs: dict[str, str]) -> GitDiff:
+    """
+    Merges paths that were uncommitted at either end of the diff, so they may differ from
+    both commits. The working tree decides: a path that exists now is listed once as added
+    or modified, and one that does not is listed only as deleted. Renamed paths are left
+    to the rename handling.
+    """
+    renamed = {path for rename in diff.renamed for path in rename}
+    for path in sorted(dirty_paths - renamed):
+        if path in blobs:
+            if path in diff.deleted:
+                diff.deleted.remove(path)
+            if path not in diff.added and path not in diff.modified:
+                diff.modified.append(path)
+        else:
+            if path in diff.added:
+                diff.added.remove(path)
+            if path in diff.modified:
+                diff.modified.remove(path)
+            if path not in diff.deleted:
+                diff.deleted.append(path)
+    return diff
@@ -0,0 +1,116 @@
+import os
+import json
+
+from llama_index.core import VectorStoreIndex
+
+from classes.FileNode import FileNode
+from file_management import get_scanner
+from git_repository import (
+    GitDiff,
+    add_dirty_paths,
+    diff_commits,
+    get_blob_hashes,
+    get_dirty_paths,
+    get_head_commit,
+    has_commit,
+)
+from milvus import insert_data, delete_file_nodes, rename_file_nodes
+
+
+def _state_path() -> str:
+    return os.getenv("INDEX_STATE_PATH", ".index_state.json")
+
+
+def load_index_state(folder_path: str) -> dict:
+    """Returns the commit and dirty paths recorded by the last git sync of folder_path."""
+    path = _state_path()
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get(os.path.abspath(folder_path), {})
+
+
+def save_index_state(folder_path: str, commit: str, dirty_paths: list[str]) -> None:
+    path = _state_path()
+    state = {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    state[os.path.abspath(folder_path)] = {"commit": commit, "dirty_paths": dirty_paths}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def sync_repository(folder_path: str, index: VectorStoreIndex) -> GitDiff:
+    """
+    Brings the index in line with the working tree of a git repository.
+    With a recorded commit only the paths in `git diff` are chunked and embedded, and pure
+    renames are applied as metadata updates. Without one, or when it is no longer reachable
+    after a force push, rebase or shallow clone, every file is checked against the stored
+    blob hashes, so a fresh clone does not re-embed unchanged code.
+    """
+    print("---- Git Sync ----")
+    scanner = get_scanner(folder_path)
+    head_commit = get_head_commit(folder_path)
+    blobs = get_blob_hashes(folder_path)
+    dirty_paths = get_dirty_paths(folder_path)
+    state = load_index_state(folder_path)
+
+    if state.get("commit") and not has_commit(folder_path, state["commit"]):
+        print(f"Indexed commit {state['commit']} is no longer reachable")
+        state = {}
+
+    if state.get("commit"):
+        print(f"Diffing indexed commit {state['commit']} against {head_commit}")
+        diff = diff_commits(folder_path, state["commit"], head_commit)
+        # files that were dirty last time, or are dirty now, may differ from both commits
+        add_dirty_paths(diff, set(state.get("dirty_paths", [])) | set(dirty_paths), blobs)
+    else:
+        print("No indexed commit recorded, comparing every file by blob hash")
+        diff = GitDiff(modified=sorted(blobs))
+
+    def _full_path(rel_path: str) -> str:
+        return os.path.join(folder_path, rel_path).replace("\\", "/")
+
+    def _is_code(rel_path: str) -> bool:
+        return os.path.splitext(rel_path)[1].lower() in scanner.extensions
+
+    deleted = [_full_path(p) for p in diff.deleted if _is_code(p)]
+    renames = []
+    changed = [p for p in dict.fromkeys(diff.added + diff.modified) if p in blobs and _is_code(p)]
+    for old_path, new_path in diff.renamed:
+        if not _is_code(old_path) and not _is_code(new_path):
+            continue
+        if new_path not in blobs or not scanner.accepts(new_path):
+            deleted.append(_full_path(old_path))
+        elif new_path in dirty_paths:
+            # the renamed file was edited afterwards, so it needs a re-embed anyway
+            deleted.append(_full_path(old_path))
+            changed.append(new_path)
+        else:
+            renames.append((_full_path(old_path), _full_path(new_path)))
+
+    # renames are applied first, a file whose old path was never indexed is embedded instead
+    missing = rename_file_nodes(renames, index)
+    rel_paths = {_full_path(p): p for _, p in diff.renamed}
+    changed.extend(rel_paths[p] for p in missing)
+
+    file_nodes: list[FileNode] = []
+    for rel_path in changed:
+        if not scanner.accepts(rel_path):
+            # a file that stopped being indexable should not keep stale chunks
+            deleted.append(_full_path(rel_path))
+            continue
+        try:
+            file_nodes.append(FileNode(_full_path(rel_path), git_blob=blobs[rel_path]))
+        except Exception as e:
+            print(f"Skipping {rel_path} due to error: {e}")
+
+    print(f"{len(file_nodes)} changed, {len(renames)} renamed, {len(deleted)} deleted")
+    delete_file_nodes(deleted, index)
+    insert_data(file_data=file_nodes, index=index)
+
+    save_index_state(folder_path, head_commit, dirty_paths)
+    return diff
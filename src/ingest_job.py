@@ -0,0 +1,118 @@
+import os
+import sys
+from pprint import pprint
+
+from dotenv import load_dotenv
+from llama_index.core import VectorStoreIndex
+
+from classes.FileNode import FileNode
+from classes.IngestJournal import IngestJournal, SCANNED, CHUNKED, WRITTEN, FAILED
+from file_management import get_scanner
+from milvus import (
+    milvus_config,
+    set_milvus_index,
+    find_changed_files,
+    write_file_nodes,
+    delete_file_nodes,
+)
+
+load_dotenv()
+
+
+def get_journal() -> IngestJournal:
+    return IngestJournal(os.getenv("INGEST_JOURNAL_PATH", ".ingest_journal.sqlite"))
+
+
+def _process_batch(journal: IngestJournal, job_id: str, batch_id: int,
+                   file_paths: list[str], index: VectorStoreIndex, overwrite: bool) -> None:
+    """
+    Chunks and writes one batch. Files of an overwrite job go into a freshly dropped
+    collection, and files a crashed run already took past SCANNED may be partly written,
+    so both are written without asking Milvus which version it holds. Rewriting is cheap
+    and idempotent, chunks are upserted by content hash and their embeddings come from
+    the journal. Other files are only written when their stored version differs.
+    """
+    states = journal.get_file_states(job_id, file_paths)
+    file_nodes: list[FileNode] = []
+    for file_path in file_paths:
+        try:
+            file_nodes.append(FileNode(file_path))
+        except Exception as e:
+            # a file that cannot be chunked should not block the rest of the job
+            print(f"Skipping {file_path} due to error: {e}")
+            journal.set_file_state(job_id, [file_path], FAILED, str(e))
+    journal.set_file_state(job_id, [f.file_path for f in file_nodes], CHUNKED)
+
+    forced = [f for f in file_nodes if overwrite or states.get(f.file_path) != SCANNED]
+    forced_paths = {f.file_path for f in forced}
+    changed_files = forced + find_changed_files(
+        [f for f in file_nodes if f.file_path not in forced_paths], index)
+    if changed_files:
+        write_file_nodes(changed_files, index,
+                         embedding_cache=journal.embedding_cache(job_id, batch_id))
+    # only reached once every upsert of the batch succeeded
+    journal.set_file_state(job_id, [f.file_path for f in file_nodes], WRITTEN)
+
+
+def run_ingest_job(folder_path: str, overwrite: bool = False, batch_size: int = 25,
+                   resume: bool = True) -> str:
+    """
+    Ingests folder_path in batches of files, journaling each step. If resume is set and the
+    latest unfinished job for the folder was started with the same overwrite flag, it is
+    resumed: written batches are skipped, embeddings already returned for the current batch
+    are reused, and the collection is not dropped again. Otherwise a new job is started and
+    any unfinished one is marked abandoned.
+    Without overwrite a new job only chunks the files the scanner reports as changed since
+    the last completed job, and drops the files it reports as removed. The scan cache is
+    saved when such a job completes, so an interrupted one is fully rescanned next time.
+    Returns the job id.
+    """
+    journal = get_journal()
+    scanner = None
+    job_id = journal.find_unfinished_job(folder_path, overwrite) if resume else None
+    if job_id:
+        print(f"---- Resuming Ingest Job {job_id} ----")
+        journal.resume_job(job_id)
+        ctx = milvus_config()
+    else:
+        abandoned = journal.abandon_jobs(folder_path)
+        if abandoned:
+            print(f"Abandoned {abandoned} unfinished ingest jobs for {folder_path}")
+        scanner = get_scanner(folder_path)
+        scan_result = scanner.scan()
+        # the collection is dropped on overwrite, so every file is ingested again
+        file_paths = [f.file_path for f in scan_result.files if overwrite or f.changed]
+        job_id = journal.create_job(folder_path, overwrite, file_paths, batch_size)
+        print(f"---- Starting Ingest Job {job_id} with {len(file_paths)} of "
+              f"{len(scan_result.files)} files ----")
+        ctx = milvus_config(overwrite=overwrite)
+    index = set_milvus_index(ctx)
+
+    try:
+        if scanner and not overwrite:
+            delete_file_nodes(scan_result.removed, index)
+        for batch_id, file_paths in journal.pending_batches(job_id):
+            _process_batch(journal, job_id, batch_id, file_paths, index, overwrite)
+            progress = journal.progress(job_id)
+            eta = progress["eta_seconds"]
+            print(f"Batch {batch_id} written, {progress['done_files']}/{progress['total_files']} "
+                  f"files done" + (f", ETA {eta:.0f}s" if eta is not None else ""))
+    except BaseException as e:
+        journal.finish_job(job_id, error=repr(e))
+        journal.close()
+        raise
+
+    journal.finish_job(job_id)
+    journal.close()
+    if scanner:
+        scanner.save_cache()
+    print(f"---- Ingest Job {job_id} Completed ----")
+    return job_id
+
+
+if __name__ == "__main__":
+    # Usage: python ingest_job.py [job_id]
+    # Prints the progress of a job, the latest one by default. Safe to run while a job is running.
+    journal = get_journal()
+    pprint(journal.progress(sys.argv[1] if len(sys.argv) > 1 else None))
+    journal.close()
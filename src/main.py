@@ -1,4 +1,4 @@
-from milvus import milvus_config, set_milvus_index, insert_data
+from milvus import milvus_config, set_milvus_index, get_milvus_client
 from llama_index.llms.gemini import Gemini
 from llama_index.core import Settings
 from classes.Milvus import Milvus
@@ -13,28 +13,94 @@ from llama_index.core.vector_stores import (
 import os
 import asyncio
 from dotenv import load_dotenv
-from file_management import generate_file_nodes
+from git_sync import sync_repository
+from reconcile import reconcile_index
+from ingest_job import run_ingest_job
+from collection_schema import migrate_collection, ensure_collection
+from summaries import ensure_summaries, rebuild_summaries
 from agent.gemin_code_doc_agent import GeminiCodeDocumentationReActAgent
 
 load_dotenv()
 
 
+# connected by the agent in main(), so importing this module for project_migrate works
+# while the collection is still untyped
 milvus_instance = Milvus()
-milvus_instance.connect()
 
 
 def project_init():
     """
     Initialize the collection and index and insert documents without pre-checks
     Only run this for a new collection or when you want to reset everything.
+    The run is journaled, so rerunning after a crash resumes it instead of starting over,
+    see ingest_job.run_ingest_job.
     """
-    ctx = milvus_config(overwrite=True)  # Overwrite existing collection
+    folder_path = os.getenv("FILE_PATH")
+    run_ingest_job(folder_path, overwrite=True)  # Overwrite existing collection
+
+
+def project_update():
+    """
+    Ingest the files changed since the last completed ingest job, and drop removed ones.
+    Unchanged files are skipped by the scanner's stat cache without being read.
+    """
+    folder_path = os.getenv("FILE_PATH")
+    run_ingest_job(folder_path, overwrite=False)
+
+
+def project_sync():
+    """
+    Incrementally sync a git repository into the existing collection.
+    Only the files changed since the last synced commit are re-embedded.
+    """
+    ctx = milvus_config()
     index = set_milvus_index(ctx)
     folder_path = os.getenv("FILE_PATH")
-    file_nodes = generate_file_nodes(folder_path)
+    sync_repository(folder_path, index)
+    # a sync only summarizes the files it touched, older files may still lack a summary
+    ensure_summaries(index.vector_store.client)
+
+
+def project_reconcile(dry_run: bool = False):
+    """
+    Purge vectors of files that were deleted or moved out of FILE_PATH.
+    Safe to run on a schedule, see reconcile_index for the guards it applies.
+    """
     ctx = milvus_config()
     index = set_milvus_index(ctx)
-    insert_data(file_data=file_nodes, index=index)
+    folder_path = os.getenv("FILE_PATH")
+    return reconcile_index(folder_path, index, dry_run=dry_run)
+
+
+def project_migrate():
+    """
+    Move an existing untyped collection to the typed schema with scalar indexes,
+    and build the file and directory summaries from the copied vectors.
+    Vectors are copied, nothing is re-embedded.
+    """
+    # milvus_config refuses an untyped collection, so the migration uses a plain client
+    client = get_milvus_client()
+    legacy_name = migrate_collection(client)
+    ensure_collection(client)
+    if legacy_name:
+        rebuild_summaries(client)
+    else:
+        # an already typed collection may predate the summaries
+        ensure_summaries(client)
+    return legacy_name
+
+
+def project_summaries(rebuild: bool = False):
+    """
+    Fill in missing file and directory summaries, or recompute all of them with rebuild.
+    Retrieval stays flat while any indexed file lacks a summary.
+    """
+    ctx = milvus_config()
+    client = ctx.vector_store.client
+    if rebuild:
+        rebuild_summaries(client)
+    else:
+        ensure_summaries(client)
 
 
 async def main():
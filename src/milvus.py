@@ -8,25 +8,51 @@ from llama_index.core.vector_stores import (
     FilterOperator,
 )
 from llama_index.core.vector_stores.types import VectorStoreQuery
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
+from pymilvus import MilvusClient
 
 
 from dotenv import load_dotenv
 import os
 from classes.FileNode import FileNode
+from collection_schema import (
+    COLLECTION_NAME,
+    EMBEDDING_DIM,
+    FILE_FILTER,
+    FILES_FILTER,
+    IDS_FILTER,
+    REFERENCE_FIELDS,
+    apply_references,
+    ensure_collection,
+    row_references,
+)
+from summaries import update_summaries
 from pprint import pprint
 import json
 
 load_dotenv()
 
+MILVUS_URI = "https://in03-890cd99e122622e.serverless.aws-eu-central-1.cloud.zilliz.com"
+
+# chunks sent per embedding call, each call's result is cached before the next one is made
+EMBEDDING_BATCH_SIZE = 50
+
+
+def get_milvus_client() -> MilvusClient:
+    return MilvusClient(uri=MILVUS_URI, token=os.getenv("MILVUS_TOKEN"))
+
 
 def milvus_config(overwrite: bool = False) -> StorageContext:
     print("----- Connecting to Milvus -----")
+    # The typed collection is created here, MilvusVectorStore would otherwise create an
+    # untyped one that keeps all metadata in the dynamic JSON field.
+    ensure_collection(get_milvus_client(), overwrite=overwrite)
     vector_store = MilvusVectorStore(
-        uri="https://in03-890cd99e122622e.serverless.aws-eu-central-1.cloud.zilliz.com",
+        uri=MILVUS_URI,
         token=os.getenv("MILVUS_TOKEN"),
-        collection_name="source_code_collection",
-        dim=768,  # Vector dimension depends on the embedding model
-        overwrite=overwrite,  # Drop collection if exists
+        collection_name=COLLECTION_NAME,
+        dim=EMBEDDING_DIM,
+        overwrite=False,  # Dropping is handled by ensure_collection
     )
     storage_context = StorageContext.from_defaults(vector_store=vector_store)
     print("----- Milvus Connected - Storage Context Generated -----")
@@ -75,13 +101,16 @@ def find_by_metadata(file: FileNode, index: VectorStoreIndex) -> list[TextNode]:
 
     client = index.vector_store.client
     print("---- Querying Directly From Milvus Collection ----")
+    query_filter = f"{FILE_FILTER} and file_last_updated_at != {{file_last_updated_at}}"
+    filter_params = {"file_path": file.file_path,
+                     "file_last_updated_at": file.file_last_updated_at}
     print("Running query:")
-    print(
-        f'file_path == "{file.file_path}" AND file_last_updated_at != "{file.file_last_updated_at}"')
+    print(query_filter, filter_params)
     results = client.query(
-        collection_name="source_code_collection",
-        # No quotes!
-        filter=f'file_path == "{file.file_path}" AND file_last_updated_at != {file.file_last_updated_at}',
+        collection_name=COLLECTION_NAME,
+        # file_last_updated_at is a DOUBLE column, so the comparison is numeric
+        filter=query_filter,
+        filter_params=filter_params,
         output_fields=["text", "_node_content"],
         limit=1000
     )
@@ -103,51 +132,217 @@ def find_by_metadata(file: FileNode, index: VectorStoreIndex) -> list[TextNode]:
     return text_nodes
 
 
-def insert_data(file_data: list[FileNode], index: VectorStoreIndex):
-    if not file_data:
-        print("No files to process")
-        return False
+def _node_to_row(node: TextNode, embedding: list[float]) -> dict:
+    """Builds a row in the same layout MilvusVectorStore.add writes."""
+    row = node_to_metadata_dict(node, remove_text=True, flat_metadata=False)
+    row["id"] = node.node_id
+    row["embedding"] = embedding
+    row["text"] = node.text
+    return row
+
+
+def _query_rows(client, filter: str, filter_params: dict, limit: int = 16384) -> list[dict]:
+    return client.query(
+        collection_name=COLLECTION_NAME,
+        filter=filter,
+        filter_params=filter_params,
+        output_fields=["*"],
+        limit=limit
+    )
+
+
+def _query_rows_of_files(client, file_paths: list[str], limit: int = 16384) -> dict[str, dict]:
+    """
+    Every row referencing one of file_paths. A query that returns limit rows may have been
+    truncated, so its group of files is split in halves and queried again until each query
+    provably returns everything.
+    """
+    rows: dict[str, dict] = {}
+    groups = [file_paths[i:i + 50] for i in range(0, len(file_paths), 50)]
+    while groups:
+        group = groups.pop()
+        results = _query_rows(client, FILES_FILTER, {"file_paths": group}, limit=limit)
+        if len(results) < limit:
+            rows.update((row["id"], row) for row in results)
+            continue
+        if len(group) == 1:
+            raise RuntimeError(f"{group[0]} has {limit} or more stored chunks, above the query limit")
+        middle = len(group) // 2
+        groups += [group[:middle], group[middle:]]
+    return rows
+
+
+def _write_references(file_paths: list[str], nodes: list[TextNode], index: VectorStoreIndex,
+                      embedding_cache=None) -> None:
+    """
+    Replaces every reference held by file_paths with the given nodes. Chunks already stored
+    under the same content hash only gain a reference, unseen hashes are embedded once, and
+    chunks left without any reference are deleted.
+    An embedding_cache (see IngestJournal) is consulted before embedding, and filled after
+    every EMBEDDING_BATCH_SIZE chunks, so a quota error or a failed write can be retried
+    without re-embedding what was already returned.
+    """
+    client = index.vector_store.client
+    rows = _query_rows_of_files(client, file_paths)
+
+    new_references: dict[str, list[dict]] = {}
+    first_nodes: dict[str, TextNode] = {}
+    for node in nodes:
+        new_references.setdefault(node.node_id, []).append(
+            {key: node.metadata[key] for key in REFERENCE_FIELDS if key in node.metadata})
+        first_nodes.setdefault(node.node_id, node)
+
+    # chunks that other files already share
+    unknown = [h for h in new_references if h not in rows]
+    for i in range(0, len(unknown), 1000):
+        batch = unknown[i:i + 1000]
+        for row in _query_rows(client, IDS_FILTER, {"ids": batch}, limit=len(batch)):
+            rows[row["id"]] = row
+
+    replaced = set(file_paths)
+    upserts = []
+    deletes = []
+    for row_id, row in rows.items():
+        references = [r for r in row_references(row) if r["file_path"] not in replaced]
+        references += new_references.get(row_id, [])
+        if references:
+            upserts.append(apply_references(row, references))
+        else:
+            deletes.append(row_id)
+
+    to_embed = [h for h in new_references if h not in rows]
+    embeddings = embedding_cache.get_embeddings(to_embed) if embedding_cache else {}
+    missing = [h for h in to_embed if h not in embeddings]
+    if missing:
+        print("---- Embedding Nodes ----")
+        print(f"Embedding {len(missing)} unique chunks out of {len(nodes)} chunks")
+        for i in range(0, len(missing), EMBEDDING_BATCH_SIZE):
+            batch = missing[i:i + EMBEDDING_BATCH_SIZE]
+            # only the code is embedded, so identical chunks get identical vectors wherever they live
+            new_embeddings = dict(zip(batch, index._embed_model.get_text_embedding_batch(
+                [first_nodes[h].text for h in batch])))
+            if embedding_cache:
+                embedding_cache.put_embeddings(new_embeddings)
+            embeddings.update(new_embeddings)
+            print(f"Embedded {min(i + EMBEDDING_BATCH_SIZE, len(missing))}/{len(missing)} chunks")
+    for h in to_embed:
+        upserts.append(apply_references(
+            _node_to_row(first_nodes[h], embeddings[h]), new_references[h]))
 
+    if deletes:
+        print("---- Deleting Nodes ----")
+        print(f"Deleting {len(deletes)} unreferenced nodes")
+        client.delete(collection_name=COLLECTION_NAME, ids=deletes)
+    if upserts:
+        print("---- Upserting Nodes ----")
+        print(f"Upserting {len(upserts)} nodes ({len(to_embed)} newly embedded)")
+        for i in range(0, len(upserts), 500):
+            client.upsert(collection_name=COLLECTION_NAME, data=upserts[i:i + 500])
+
+    update_summaries(client, file_paths)
+
+
+def _is_same_version(reference: dict, file: FileNode) -> bool:
+    # The git blob hash survives clones and checkouts, so it is preferred over mtime
+    # when both sides have it.
+    if file.git_blob and reference.get("git_blob"):
+        return reference["git_blob"] == file.git_blob
+    return float(reference["file_last_updated_at"]) == file.file_last_updated_at
+
+
+def find_changed_files(file_data: list[FileNode], index: VectorStoreIndex) -> list[FileNode]:
+    """
+    Files whose stored version differs from the one on disk, or that are not stored yet.
+    Every stored chunk of the file is compared, so a file whose write was interrupted
+    between upserts is reported as changed.
+    """
     client = index.vector_store.client
-    nodes_to_insert = []
-    delete_batch = []
+    changed_files = []
 
     for file in file_data:
-        # Single query for both checking and gathering deletable nodes
         results = client.query(
-            collection_name="source_code_collection",
-            filter=f'file_path == "{file.file_path}"',
-            output_fields=["_node_content", "file_last_updated_at"],
-            limit=1000
+            collection_name=COLLECTION_NAME,
+            filter=FILE_FILTER,
+            filter_params={"file_path": file.file_path},
+            output_fields=["references"] + REFERENCE_FIELDS,
+            limit=16384
         )
+        stored = sorted(
+            (row["id"], int(r.get("chunk_index", 0)))
+            for row in results for r in row_references(row)
+            if r["file_path"] == file.file_path and _is_same_version(r, file))
+        expected = sorted(
+            (node.node_id, int(node.metadata.get("chunk_index", 0))) for node in file.nodes)
+        # Check if exact same file version exists, chunk for chunk
+        if stored and stored == expected:
+            continue
+        changed_files.append(file)
 
-        needs_insert = True
-        current_nodes = []
+    return changed_files
 
-        for r in results:
-            node_content = json.loads(r["_node_content"])
-            # Check if exact same file version exists
-            if float(r["file_last_updated_at"]) == file.file_last_updated_at:
-                needs_insert = False
-                break
-            current_nodes.append(node_content["id_"])
 
-        if needs_insert:
-            if current_nodes:
-                delete_batch.extend(current_nodes)
-            nodes_to_insert.extend(file.nodes)
+def write_file_nodes(file_data: list[FileNode], index: VectorStoreIndex, embedding_cache=None) -> None:
+    """Stores the chunks of the given files, replacing whatever was stored for them before."""
+    _write_references(
+        [file.file_path for file in file_data],
+        [node for file in file_data for node in file.nodes],
+        index,
+        embedding_cache
+    )
 
-    # Batch process deletions and inserts
-    if delete_batch:
-        print("---- Deleting Nodes ----")
-        print(f"Deleting {len(delete_batch)} nodes")
-        index.delete_nodes(node_ids=delete_batch)
-    if nodes_to_insert:
-        print("---- Inserting Nodes ----")
-        print(f"Inserting {len(nodes_to_insert)} nodes")
-        index.insert_nodes(nodes_to_insert)
-
-    return bool(delete_batch or nodes_to_insert)
+
+def insert_data(file_data: list[FileNode], index: VectorStoreIndex):
+    if not file_data:
+        print("No files to process")
+        return False
+
+    changed_files = find_changed_files(file_data, index)
+    if not changed_files:
+        return False
+
+    print(f"{len(changed_files)} of {len(file_data)} files changed")
+    write_file_nodes(changed_files, index)
+    return True
+
+
+def delete_file_nodes(file_paths: list[str], index: VectorStoreIndex) -> None:
+    """
+    Drops the references of the given files. Chunks that no other file shares are deleted,
+    shared ones are kept with their remaining references.
+    """
+    if not file_paths:
+        return
+    print("---- Deleting Nodes Of Removed Files ----")
+    _write_references(file_paths, [], index)
+
+
+def rename_file_nodes(renames: list[tuple[str, str]], index: VectorStoreIndex) -> list[str]:
+    """
+    Moves the references of renamed files to their new path by rewriting metadata in place.
+    The stored vectors are reused, so no embedding calls are made.
+    Returns the new paths whose old path had nothing stored.
+    """
+    client = index.vector_store.client
+    missing = []
+    for old_path, new_path in renames:
+        rows = list(_query_rows_of_files(client, [old_path]).values())
+        if not rows:
+            print(f"No nodes found to rename for file: {old_path}")
+            missing.append(new_path)
+            continue
+        last_updated_at = os.path.getmtime(new_path)
+        for row in rows:
+            references = []
+            for reference in row_references(row):
+                if reference["file_path"] == old_path:
+                    reference = {**reference, "file_path": new_path,
+                                 "file_last_updated_at": last_updated_at}
+                references.append(reference)
+            apply_references(row, references)
+        client.upsert(collection_name=COLLECTION_NAME, data=rows)
+        print(f"Renamed {len(rows)} nodes: {old_path} -> {new_path}")
+        update_summaries(client, [old_path, new_path])
+    return missing
 
 
 def is_insertion_required(file_path: str, file_data: list[dict], index: VectorStoreIndex) -> bool:
@@ -0,0 +1,114 @@
+from dataclasses import dataclass
+
+from llama_index.core import VectorStoreIndex
+
+from file_management import get_scanner
+from collection_schema import COLLECTION_NAME, IDS_FILTER
+from milvus import delete_file_nodes
+from summaries import update_summaries
+
+
+@dataclass
+class ReconcileReport():
+    scanned_files: int = 0
+    indexed_files: int = 0
+    orphaned_files: int = 0
+    scanned_vectors: int = 0
+    deleted_vectors: int = 0
+    # shared chunks that lost some references but are still used by live files
+    trimmed_vectors: int = 0
+    aborted: bool = False
+
+
+def _row_paths(row: dict) -> list[str]:
+    # rows stored before chunks were deduplicated only have file_path
+    return row.get("file_paths") or [row["file_path"]]
+
+
+def reconcile_index(folder_path: str,
+                    index: VectorStoreIndex,
+                    dry_run: bool = False,
+                    max_orphan_ratio: float = 0.5,
+                    batch_size: int = 1000) -> ReconcileReport:
+    """
+    Removes vectors of files under folder_path that no longer exist in the scanned tree.
+    The collection is streamed with a query iterator, chunks referenced only by orphaned
+    files are deleted with batched `id in [...]` expressions, and chunks still shared with
+    live files only lose the orphaned references.
+
+    As a guard for scheduled runs nothing is deleted if the scan finds no files, or if more
+    than max_orphan_ratio of the indexed files would be purged, e.g. when the checkout is
+    missing or half mounted.
+    """
+    print("---- Reconciling Index ----")
+    client = index.vector_store.client
+    report = ReconcileReport()
+
+    prefix = folder_path.replace("\\", "/").rstrip("/") + "/"
+    live_paths = {f.file_path for f in get_scanner(folder_path).scan().files}
+    report.scanned_files = len(live_paths)
+
+    indexed_paths = set()
+    orphan_ids: list[str] = []
+    shared_orphan_paths = set()
+    iterator = client.query_iterator(
+        collection_name=COLLECTION_NAME,
+        batch_size=batch_size,
+        filter='id != ""',
+        output_fields=["file_path", "file_paths"]
+    )
+    try:
+        while True:
+            rows = iterator.next()
+            if not rows:
+                break
+            report.scanned_vectors += len(rows)
+            for row in rows:
+                paths = _row_paths(row)
+                indexed_paths.update(p for p in paths if p.startswith(prefix))
+                # references outside folder_path belong to other roots and are left alone
+                orphans = [p for p in paths if p.startswith(prefix) and p not in live_paths]
+                if not orphans:
+                    continue
+                if len(orphans) == len(paths):
+                    orphan_ids.append(row["id"])
+                else:
+                    shared_orphan_paths.update(orphans)
+                    report.trimmed_vectors += 1
+    finally:
+        iterator.close()
+
+    orphaned_files = sorted(indexed_paths - live_paths)
+    report.indexed_files = len(indexed_paths)
+    report.orphaned_files = len(orphaned_files)
+    print(f"{report.orphaned_files} of {report.indexed_files} indexed files are orphaned, "
+          f"{len(orphan_ids)} vectors to delete, {report.trimmed_vectors} to trim")
+
+    if orphaned_files and (not live_paths
+                           or report.orphaned_files > max_orphan_ratio * report.indexed_files):
+        print(f"Refusing to purge {report.orphaned_files} files, "
+              f"above the {max_orphan_ratio:.0%} safety ratio. Check {folder_path} and rerun "
+              f"with a higher max_orphan_ratio if this is expected.")
+        report.aborted = True
+        return report
+
+    if dry_run:
+        for path in orphaned_files:
+            print(f"Would purge: {path}")
+        return report
+
+    for i in range(0, len(orphan_ids), batch_size):
+        batch = orphan_ids[i:i + batch_size]
+        result = client.delete(
+            collection_name=COLLECTION_NAME,
+            filter=IDS_FILTER,
+            filter_params={"ids": batch}
+        )
+        report.deleted_vectors += result.get("delete_count", len(batch))
+    if shared_orphan_paths:
+        delete_file_nodes(sorted(shared_orphan_paths), index)
+    update_summaries(client, orphaned_files)
+
+    print(f"Reclaimed {report.deleted_vectors} vectors from {report.orphaned_files} orphaned files, "
+          f"trimmed references on {report.trimmed_vectors} shared vectors")
+    return report
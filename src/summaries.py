@@ -0,0 +1,209 @@
+import os
+import posixpath
+import sys
+
+import numpy as np
+from dotenv import load_dotenv
+from pymilvus import MilvusClient
+
+from collection_schema import (
+    COLLECTION_NAME,
+    SUMMARY_COLLECTION_NAME,
+    set_summaries_complete,
+    FILE_FILTER,
+    IDS_FILTER,
+    PARENTS_FILTER,
+)
+
+
+"""
+    File and directory level vectors for coarse-to-fine retrieval.
+    A file vector is the mean of the embeddings of the chunks it references, and a directory
+    vector is the mean of its children weighted by how many chunks each one covers.
+    Both are L2 normalized so they can be searched with the same IP metric as the chunks.
+"""
+
+
+def _summary_id(level: str, path: str) -> str:
+    return f"{level}:{path}"
+
+
+def _parent(path: str) -> str:
+    parent = posixpath.dirname(path)
+    return "" if parent == path else parent
+
+
+def _summary_root() -> str:
+    # the indexed folder, as the file paths stored in the collection start with it
+    return (os.getenv("FILE_PATH") or "").replace("\\", "/").rstrip("/")
+
+
+def _ancestors(path: str, root: str = None) -> list[str]:
+    """
+    Directories strictly inside root that contain path. Directories at or above the root
+    would all average to the whole repository and filter nothing in search_candidate_files.
+    """
+    root = _summary_root() if root is None else root
+    if not root or not path.startswith(root + "/"):
+        return []
+    ancestors = []
+    parent = _parent(path)
+    while parent and parent != root:
+        ancestors.append(parent)
+        parent = _parent(parent)
+    return ancestors
+
+
+def like_prefix(directory: str) -> str:
+    """A LIKE pattern matching everything under directory, with % and _ in the name escaped."""
+    escaped = directory.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}/%"
+
+
+def _normalized_mean(vectors: list, weights: list[int] = None) -> list[float]:
+    mean = np.average(np.asarray(vectors, dtype=np.float32), axis=0, weights=weights)
+    norm = np.linalg.norm(mean)
+    return (mean / norm if norm else mean).tolist()
+
+
+def _update_file(client: MilvusClient, file_path: str) -> None:
+    rows = client.query(
+        collection_name=COLLECTION_NAME,
+        filter=FILE_FILTER,
+        filter_params={"file_path": file_path},
+        output_fields=["embedding"],
+        limit=16384
+    )
+    row_id = _summary_id("file", file_path)
+    if not rows:
+        client.delete(collection_name=SUMMARY_COLLECTION_NAME,
+                      filter=IDS_FILTER, filter_params={"ids": [row_id]})
+        return
+    client.upsert(collection_name=SUMMARY_COLLECTION_NAME, data=[{
+        "id": row_id,
+        "embedding": _normalized_mean([r["embedding"] for r in rows]),
+        "level": "file",
+        "path": file_path,
+        "parent": _parent(file_path),
+        "chunk_count": len(rows),
+    }])
+
+
+def _update_directory(client: MilvusClient, directory: str) -> None:
+    children = client.query(
+        collection_name=SUMMARY_COLLECTION_NAME,
+        filter=PARENTS_FILTER,
+        filter_params={"parents": [directory]},
+        output_fields=["embedding", "chunk_count"],
+        limit=16384
+    )
+    row_id = _summary_id("directory", directory)
+    if not children:
+        client.delete(collection_name=SUMMARY_COLLECTION_NAME,
+                      filter=IDS_FILTER, filter_params={"ids": [row_id]})
+        return
+    client.upsert(collection_name=SUMMARY_COLLECTION_NAME, data=[{
+        "id": row_id,
+        "embedding": _normalized_mean(
+            [c["embedding"] for c in children], [c["chunk_count"] for c in children]),
+        "level": "directory",
+        "path": directory,
+        "parent": _parent(directory),
+        "chunk_count": sum(c["chunk_count"] for c in children),
+    }])
+
+
+def update_summaries(client: MilvusClient, file_paths: list[str]) -> None:
+    """
+    Recomputes the vectors of the given files and of every directory above them.
+    Directories are processed deepest first so each one averages up to date children.
+    """
+    if not file_paths:
+        return
+    print("---- Updating File And Directory Summaries ----")
+    directories = set()
+    for file_path in sorted(set(file_paths)):
+        _update_file(client, file_path)
+        directories.update(_ancestors(file_path))
+    for directory in sorted(directories, key=lambda d: d.count("/"), reverse=True):
+        _update_directory(client, directory)
+    print(f"Updated {len(set(file_paths))} file and {len(directories)} directory summaries")
+
+
+def _collect_paths(client: MilvusClient, collection_name: str, query_filter: str,
+                   field_name: str, batch_size: int = 1000) -> set[str]:
+    paths = set()
+    iterator = client.query_iterator(
+        collection_name=collection_name,
+        batch_size=batch_size,
+        filter=query_filter,
+        output_fields=[field_name]
+    )
+    try:
+        while True:
+            rows = iterator.next()
+            if not rows:
+                break
+            for row in rows:
+                value = row[field_name]
+                paths.update(value if isinstance(value, list) else [value])
+    finally:
+        iterator.close()
+    return paths
+
+
+def summary_gaps(client: MilvusClient) -> list[str]:
+    """
+    Files whose summary is missing or stale: indexed files without a file vector, and file
+    vectors of files that are no longer indexed. Scans both collections, so it runs from
+    ensure_summaries and not when retrieval starts. Retrieval stays flat until the gaps are
+    filled, otherwise files without a summary could never be reached by the hierarchical search.
+    """
+    indexed = _collect_paths(client, COLLECTION_NAME, 'id != ""', "file_paths")
+    summarized = _collect_paths(client, SUMMARY_COLLECTION_NAME, 'level == "file"', "path")
+    gaps = sorted(indexed ^ summarized)
+    print(f"File summaries cover {len(indexed & summarized)} of {len(indexed)} indexed files, "
+          f"{len(summarized - indexed)} stale")
+    return gaps
+
+
+def ensure_summaries(client: MilvusClient) -> None:
+    """
+    Fills in missing summaries and drops stale ones, e.g. for a collection typed before
+    summaries existed, then marks the summaries complete so retrieval can use them.
+    """
+    gaps = summary_gaps(client)
+    if gaps:
+        update_summaries(client, gaps)
+    set_summaries_complete(client)
+
+
+def rebuild_summaries(client: MilvusClient) -> None:
+    """
+    Recomputes the summaries of every indexed file and drops those of files no longer
+    indexed, along with directory summaries outside the indexed root.
+    """
+    indexed = _collect_paths(client, COLLECTION_NAME, 'id != ""', "file_paths")
+    summarized = _collect_paths(client, SUMMARY_COLLECTION_NAME, 'level == "file"', "path")
+    update_summaries(client, sorted(indexed | summarized))
+
+    if not _summary_root():
+        print("FILE_PATH is not set, only file summaries are built")
+    directories = {d for path in indexed for d in _ancestors(path)}
+    stale = _collect_paths(client, SUMMARY_COLLECTION_NAME, 'level == "directory"', "path") - directories
+    if stale:
+        client.delete(collection_name=SUMMARY_COLLECTION_NAME, filter=IDS_FILTER,
+                      filter_params={"ids": [_summary_id("directory", d) for d in stale]})
+        print(f"Dropped {len(stale)} stale directory summaries")
+    set_summaries_complete(client)
+
+
+if __name__ == "__main__":
+    # Usage: python summaries.py [--rebuild]
+    # Fills in missing file and directory summaries, or recomputes all of them with --rebuild.
+    load_dotenv()
+    client = MilvusClient(uri=os.getenv("MILVUS_URI"), token=os.getenv("MILVUS_TOKEN"))
+    if "--rebuild" in sys.argv[1:]:
+        rebuild_summaries(client)
+    else:
+        ensure_summaries(client)
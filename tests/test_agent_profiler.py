@@ -0,0 +1,105 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("llama_index.core")
+pytest.importorskip("llama_index.llms.gemini")
+
+from llama_index.core.bridge.pydantic import Field
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.llms import CustomLLM, CompletionResponse, LLMMetadata
+from llama_index.core.llms.callbacks import llm_completion_callback
+
+from agent.gemin_code_doc_agent import GeminiCodeDocumentationReActAgent
+from agent.profiler import AgentProfiler
+from classes.Milvus import Milvus
+from collection_schema import SUMMARY_COLLECTION_NAME
+
+
+class ScriptedLLM(CustomLLM):
+    """Returns the next scripted ReAct step on every call, whatever the prompt."""
+    responses: list[str] = Field(default_factory=list)
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(model_name="scripted")
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs) -> CompletionResponse:
+        return CompletionResponse(text=self.responses.pop(0))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs):
+        text = self.responses.pop(0)
+
+        def gen():
+            yield CompletionResponse(text=text, delta=text)
+        return gen()
+
+
+class FakeMilvusClient():
+    """Answers the directory, file and chunk searches of Milvus.retrieve_nodes."""
+
+    def search(self, collection_name: str, filter: str = "", **kwargs) -> list[list[dict]]:
+        if collection_name == SUMMARY_COLLECTION_NAME:
+            path = "src" if filter == 'level == "directory"' else "src/config.py"
+            return [[{"id": path, "distance": 0.9, "entity": {"path": path}}]]
+        metadata = {
+            "file_path": "src/config.py",
+            "chunk_index": 0,
+            "references": [{"file_path": "src/config.py", "chunk_index": 0}],
+            "file_paths": ["src/config.py"],
+        }
+        return [[{
+            "id": "chunk-1",
+            "distance": 0.8,
+            "entity": {
+                "text": "def load_config(path):\n    return parse(path)\n",
+                "_node_content": json.dumps({"metadata": metadata}),
+            },
+        }]]
+
+
+def _connected_milvus(profiler: AgentProfiler) -> Milvus:
+    milvus = Milvus()
+    milvus.embed_model = MockEmbedding(embed_dim=8)
+    milvus.vector_store = SimpleNamespace(client=FakeMilvusClient())
+    milvus.summaries_complete = True
+    milvus.profiler = profiler
+    return milvus
+
+
+def test_invoke_records_llm_steps_tool_call_and_retrieval_spans():
+    profiler = AgentProfiler()
+    agent_app = GeminiCodeDocumentationReActAgent(profiler=profiler)
+    # connect_milvus would open a real connection
+    agent_app.milvus = _connected_milvus(profiler)
+    agent_app.initialize_agent(model_name="scripted", llm=ScriptedLLM(responses=[
+        "Thought: I need to find where the config is loaded.\n"
+        "Action: retrieve_codes_from_vector_database\n"
+        'Action Input: {"query": "load config"}',
+        "Thought: I can answer without using any more tools.\n"
+        "Answer: load_config in src/config.py parses the file.",
+    ]))
+
+    asyncio.run(agent_app.invoke("Where is the config loaded?"))
+    trace = agent_app.last_trace
+
+    assert len(trace["llm_steps"]) == 2
+    assert all(step["latency_s"] is not None for step in trace["llm_steps"])
+    # the scripted LLM reports no usage, so tokens are estimated from characters
+    assert all(step["tokens_estimated"] for step in trace["llm_steps"])
+
+    assert len(trace["tool_calls"]) == 1
+    call = trace["tool_calls"][0]
+    assert call["tool_name"] == "retrieve_codes_from_vector_database"
+    assert call["tool_kwargs"] == {"query": "load config"}
+    assert call["duration_s"] is not None
+    assert call["output_chars"] > 0
+    assert set(call["spans"]) == {
+        "embedding.query", "milvus.search_candidate_files", "milvus.search_chunks"}
+
+    table = AgentProfiler.summary_table(trace)
+    assert "retrieve_codes_from_vector_database" in table
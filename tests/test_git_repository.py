@@ -0,0 +1,98 @@
+import subprocess
+
+import pytest
+
+from git_repository import (
+    GitDiff,
+    add_dirty_paths,
+    diff_commits,
+    get_blob_hashes,
+    get_dirty_paths,
+    get_head_commit,
+    has_commit,
+)
+
+
+def _run(repo, *args: str) -> None:
+    subprocess.run(["git", "-C", str(repo), *args], check=True, capture_output=True)
+
+
+def _commit(repo, message: str) -> str:
+    _run(repo, "add", "-A")
+    _run(repo, "-c", "user.name=test", "-c", "user.email=test@example.com",
+         "commit", "-q", "-m", message)
+    return get_head_commit(str(repo))
+
+
+@pytest.fixture
+def repo(tmp_path):
+    _run(tmp_path, "init", "-q")
+    (tmp_path / "a.py").write_text("a = 1\n")
+    (tmp_path / "b.py").write_text("b = 1\n")
+    (tmp_path / "c.py").write_text("def c():\n    return 'a file long enough to be a rename'\n")
+    (tmp_path / "d.py").write_text("d = 1\n")
+    return tmp_path
+
+
+def test_diff_commits_classifies_changes(repo):
+    base = _commit(repo, "base")
+    (repo / "a.py").write_text("a = 2\n")
+    (repo / "b.py").unlink()
+    (repo / "c.py").rename(repo / "moved.py")
+    (repo / "e.py").write_text("e = 1\n")
+    head = _commit(repo, "head")
+
+    diff = diff_commits(str(repo), base, head)
+
+    assert diff.modified == ["a.py"]
+    assert diff.deleted == ["b.py"]
+    assert diff.added == ["e.py"]
+    assert diff.renamed == [("c.py", "moved.py")]
+
+
+def test_has_commit(repo):
+    head = _commit(repo, "base")
+
+    assert has_commit(str(repo), head)
+    assert not has_commit(str(repo), "0" * 40)
+
+
+def test_file_dirty_at_last_sync_and_committed_later_is_listed_once(repo):
+    base = _commit(repo, "base")
+    # the last sync saw an uncommitted edit of a.py and an untracked new.py
+    (repo / "a.py").write_text("a = 2\n")
+    (repo / "new.py").write_text("new = 1\n")
+    previous_dirty = set(get_dirty_paths(str(repo)))
+    assert previous_dirty == {"a.py", "new.py"}
+
+    (repo / "a.py").write_text("a = 3\n")
+    head = _commit(repo, "head")
+    (repo / "d.py").write_text("d = 2\n")
+    (repo / "new.py").unlink()
+
+    diff = add_dirty_paths(diff_commits(str(repo), base, head),
+                           previous_dirty | set(get_dirty_paths(str(repo))),
+                           get_blob_hashes(str(repo)))
+
+    assert diff.modified == ["a.py", "d.py"]
+    # committed, then deleted in the working tree
+    assert diff.added == []
+    assert diff.deleted == ["new.py"]
+
+
+def test_add_dirty_paths_skips_renamed_paths():
+    diff = GitDiff(renamed=[("old.py", "new.py")])
+
+    add_dirty_paths(diff, {"old.py", "new.py", "x.py", "gone.py"}, {"new.py": "1", "x.py": "2"})
+
+    assert diff.modified == ["x.py"]
+    assert diff.deleted == ["gone.py"]
+
+
+def test_add_dirty_paths_restores_file_recreated_after_delete():
+    diff = GitDiff(deleted=["back.py"])
+
+    add_dirty_paths(diff, {"back.py"}, {"back.py": "1"})
+
+    assert diff.deleted == []
+    assert diff.modified == ["back.py"]
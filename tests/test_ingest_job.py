@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("llama_index.core")
+pytest.importorskip("pymilvus")
+
+import ingest_job
+from classes.IngestJournal import IngestJournal, CHUNKED, WRITTEN
+
+
+class FakeFileNode():
+    def __init__(self, file_path: str, git_blob: str = None) -> None:
+        self.file_path = file_path
+        self.nodes = []
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = IngestJournal(str(tmp_path / "journal.sqlite"))
+    yield journal
+    journal.close()
+
+
+@pytest.fixture
+def milvus_calls(monkeypatch):
+    calls = SimpleNamespace(checked=[], written=[], fail_write=False)
+
+    def find_changed_files(file_data, index):
+        calls.checked.extend(f.file_path for f in file_data)
+        # what Milvus reports for a file whose first rows already hold the new version
+        return []
+
+    def write_file_nodes(file_data, index, embedding_cache=None):
+        if calls.fail_write:
+            raise RuntimeError("upsert failed")
+        calls.written.extend(f.file_path for f in file_data)
+
+    monkeypatch.setattr(ingest_job, "FileNode", FakeFileNode)
+    monkeypatch.setattr(ingest_job, "find_changed_files", find_changed_files)
+    monkeypatch.setattr(ingest_job, "write_file_nodes", write_file_nodes)
+    return calls
+
+
+def test_resumed_batch_rewrites_partly_written_files(journal, milvus_calls):
+    job_id = journal.create_job("repo", False, ["repo/a.py", "repo/b.py", "repo/c.py"], 25)
+    # a previous run chunked a.py and b.py and crashed between upsert pages
+    journal.set_file_state(job_id, ["repo/a.py", "repo/b.py"], CHUNKED)
+
+    ingest_job._process_batch(journal, job_id, 0, ["repo/a.py", "repo/b.py", "repo/c.py"],
+                              index=None, overwrite=False)
+
+    assert milvus_calls.written == ["repo/a.py", "repo/b.py"]
+    assert milvus_calls.checked == ["repo/c.py"]
+    assert set(journal.get_file_states(job_id, ["repo/a.py", "repo/b.py", "repo/c.py"]).values()) == {WRITTEN}
+
+
+def test_overwrite_job_writes_without_version_checks(journal, milvus_calls):
+    job_id = journal.create_job("repo", True, ["repo/a.py", "repo/b.py"], 25)
+
+    ingest_job._process_batch(journal, job_id, 0, ["repo/a.py", "repo/b.py"],
+                              index=None, overwrite=True)
+
+    assert milvus_calls.written == ["repo/a.py", "repo/b.py"]
+    assert milvus_calls.checked == []
+
+
+def test_failed_write_leaves_files_pending(journal, milvus_calls):
+    job_id = journal.create_job("repo", True, ["repo/a.py"], 25)
+    milvus_calls.fail_write = True
+
+    with pytest.raises(RuntimeError):
+        ingest_job._process_batch(journal, job_id, 0, ["repo/a.py"], index=None, overwrite=True)
+
+    assert journal.get_file_states(job_id, ["repo/a.py"]) == {"repo/a.py": CHUNKED}
+    assert journal.pending_batches(job_id) == [(0, ["repo/a.py"])]
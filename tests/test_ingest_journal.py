@@ -0,0 +1,82 @@
+import pytest
+
+from classes import IngestJournal as ingest_journal
+from classes.IngestJournal import IngestJournal, SCANNED, CHUNKED, EMBEDDED, WRITTEN, FAILED
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = IngestJournal(str(tmp_path / "journal.sqlite"))
+    yield journal
+    journal.close()
+
+
+def test_create_job_assigns_files_to_batches(journal):
+    job_id = journal.create_job("repo", False, ["repo/a.py", "repo/b.py", "repo/c.py"], 2)
+
+    assert journal.pending_batches(job_id) == [
+        (0, ["repo/a.py", "repo/b.py"]), (1, ["repo/c.py"])]
+    assert journal.get_file_states(job_id, ["repo/a.py", "repo/c.py"]) == {
+        "repo/a.py": SCANNED, "repo/c.py": SCANNED}
+
+
+def test_resume_partly_written_batch(journal):
+    job_id = journal.create_job("repo", True, ["repo/a.py", "repo/b.py", "repo/c.py"], 2)
+    journal.set_file_state(job_id, ["repo/a.py", "repo/b.py"], CHUNKED)
+    # the crash happens after the first embedding sub batch was cached
+    journal.embedding_cache(job_id, 0).put_embeddings({"hash-a": [0.5, 0.25]})
+    journal.finish_job(job_id, error="RuntimeError('quota exceeded')")
+
+    assert journal.find_unfinished_job("repo", overwrite=True) == job_id
+    journal.resume_job(job_id)
+
+    # the interrupted batch is still pending, with its files past SCANNED so they are rewritten
+    assert journal.pending_batches(job_id)[0] == (0, ["repo/a.py", "repo/b.py"])
+    assert journal.get_file_states(job_id, ["repo/a.py", "repo/b.py", "repo/c.py"]) == {
+        "repo/a.py": EMBEDDED, "repo/b.py": EMBEDDED, "repo/c.py": SCANNED}
+    # embeddings returned before the crash are reused, floats survive the float32 round trip
+    assert journal.get_embeddings(job_id, ["hash-a", "hash-b"]) == {"hash-a": [0.5, 0.25]}
+
+    journal.set_file_state(job_id, ["repo/a.py", "repo/b.py"], WRITTEN)
+    assert journal.pending_batches(job_id) == [(1, ["repo/c.py"])]
+    journal.set_file_state(job_id, ["repo/c.py"], FAILED, "bad encoding")
+    assert journal.pending_batches(job_id) == []
+
+    journal.finish_job(job_id)
+    progress = journal.progress(job_id)
+    assert progress["status"] == "completed"
+    assert progress["done_files"] == progress["total_files"] == 3
+    assert journal.get_embeddings(job_id, ["hash-a"]) == {}
+
+
+def test_unfinished_job_with_other_overwrite_flag_is_not_resumed(journal):
+    job_id = journal.create_job("repo", False, ["repo/a.py"], 25)
+    journal.finish_job(job_id, error="KeyboardInterrupt()")
+
+    assert journal.find_unfinished_job("repo", overwrite=True) is None
+    assert journal.find_unfinished_job("other", overwrite=False) is None
+
+    assert journal.abandon_jobs("repo") == 1
+    assert journal.find_unfinished_job("repo", overwrite=False) is None
+    assert journal.progress(job_id)["status"] == "abandoned"
+
+
+def test_progress_of_unknown_job_is_empty(journal):
+    assert journal.progress("missing") == {}
+    assert journal.progress() == {}
+
+
+def test_running_job_without_updates_is_stale(journal, monkeypatch):
+    job_id = journal.create_job("repo", False, ["repo/a.py", "repo/b.py"], 1)
+    journal.set_file_state(job_id, ["repo/a.py"], WRITTEN)
+    progress = journal.progress(job_id)
+    assert not progress["stale"]
+    assert progress["eta_seconds"] is not None
+
+    # the worker died, nothing touched the journal since
+    later = ingest_journal.time.time() + ingest_journal.STALE_AFTER_SECONDS + 1
+    monkeypatch.setattr(ingest_journal.time, "time", lambda: later)
+    progress = journal.progress(job_id)
+    assert progress["status"] == "running"
+    assert progress["stale"]
+    assert progress["eta_seconds"] is None
@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip("llama_index.core")
+pytest.importorskip("pymilvus")
+
+import milvus
+
+
+class FakeClient():
+    """Returns the rows referencing the requested files, truncated at the query limit."""
+
+    def __init__(self, rows_per_file: dict[str, int]) -> None:
+        self.rows = [
+            {"id": f"{path}#{i}", "file_paths": [path]}
+            for path, count in rows_per_file.items() for i in range(count)
+        ]
+        self.queries = 0
+
+    def query(self, collection_name, filter, filter_params, output_fields, limit):
+        self.queries += 1
+        wanted = set(filter_params["file_paths"])
+        return [row for row in self.rows if wanted & set(row["file_paths"])][:limit]
+
+
+def test_truncated_group_is_split_until_every_row_is_returned():
+    client = FakeClient({"a.py": 6, "b.py": 5, "c.py": 1})
+
+    rows = milvus._query_rows_of_files(client, ["a.py", "b.py", "c.py"], limit=8)
+
+    assert len(rows) == 12
+    assert client.queries > 1
+
+
+def test_single_file_above_the_limit_raises():
+    client = FakeClient({"a.py": 8})
+
+    with pytest.raises(RuntimeError):
+        milvus._query_rows_of_files(client, ["a.py"], limit=8)
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from classes.RepositoryScanner import RepositoryScanner
+
+
+def _write(root, rel_path: str, text: str = "value = 1\n") -> None:
+    path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    _write(tmp_path, ".codedocignore", "lib/w.py\n")
+    _write(tmp_path, "lib/.gitignore", "sub/\n")
+    for rel_path in ["lib/w.py", "lib/sub/x.py", "lib/ok.py", "node_modules/pkg/index.js"]:
+        _write(tmp_path, rel_path)
+    return tmp_path
+
+
+def test_accepts_applies_ignore_files_of_every_ancestor(tree):
+    scanner = RepositoryScanner(str(tree), ['.py', '.js'])
+
+    assert scanner.accepts("lib/ok.py")
+    assert not scanner.accepts("lib/w.py")
+    assert not scanner.accepts("lib/sub/x.py")
+    assert not scanner.accepts("node_modules/pkg/index.js")
+
+
+def test_accepts_agrees_with_scan(tree):
+    scanner = RepositoryScanner(str(tree), ['.py', '.js'])
+    scanned = {os.path.relpath(f.file_path, str(tree)).replace("\\", "/")
+               for f in scanner.scan().files}
+
+    candidates = ["lib/w.py", "lib/sub/x.py", "lib/ok.py", "node_modules/pkg/index.js"]
+    assert {p for p in candidates if scanner.accepts(p)} == scanned == {"lib/ok.py"}
+
+
+def test_changes_are_relative_to_the_saved_cache(tree, tmp_path_factory):
+    cache_path = str(tmp_path_factory.mktemp("cache") / "scan_cache.json")
+    scanner = RepositoryScanner(str(tree), ['.py'], cache_path=cache_path)
+    assert [f.changed for f in scanner.scan().files] == [True]
+    # nothing was saved, so a new scanner still reports the file as changed
+    assert [f.changed for f in RepositoryScanner(str(tree), ['.py'], cache_path=cache_path).scan().files] == [True]
+    scanner.save_cache()
+
+    os.remove(os.path.join(tree, "lib/ok.py"))
+    result = RepositoryScanner(str(tree), ['.py'], cache_path=cache_path).scan()
+    assert result.files == []
+    assert [os.path.basename(p) for p in result.removed] == ["ok.py"]
+
+
+def test_default_directories_can_be_brought_back_by_negation(tmp_path):
+    _write(tmp_path, "build/gen.py")
+    _write(tmp_path, "env/settings.py")
+    _write(tmp_path, ".codedocignore", "!env/\n")
+    scanner = RepositoryScanner(str(tmp_path), ['.py'])
+
+    scanned = {os.path.relpath(f.file_path, str(tmp_path)).replace("\\", "/")
+               for f in scanner.scan().files}
+
+    assert scanned == {"env/settings.py"}
+    assert scanner.accepts("env/settings.py")
+    assert not scanner.accepts("build/gen.py")